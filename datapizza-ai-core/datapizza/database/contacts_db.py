@@ -7,16 +7,22 @@ Schema:
 - contacts: contatti trovati dal Hunter
 - campaigns: campagne email inviate
 - emails_sent: tracking email individuali
+- email_bodies: corpi email (content-addressed via SHA-1)
 - updates_log: log aggiornamenti settimanali
 
 Autore: Antonio Mainenti
 """
 
+import hashlib
+import re
 import sqlite3
+import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
-from typing import List, Dict, Optional
-from dataclasses import dataclass, asdict
+from typing import List, Dict, Optional, Tuple, Union
+from dataclasses import dataclass, asdict, field
 
 @dataclass
 class Contact:
@@ -27,8 +33,8 @@ class Contact:
     organization: str = ""
     source_url: str = ""
     confidence: float = 0.0
-    first_found: str = ""
-    last_updated: str = ""
+    first_found: int = field(default_factory=lambda: int(time.time()))
+    last_updated: int = field(default_factory=lambda: int(time.time()))
     status: str = "new"  # new, contacted, responded, bounced
     
 @dataclass  
@@ -37,7 +43,7 @@ class EmailSent:
     email_to: str
     subject: str
     body: str
-    sent_at: str
+    sent_at: Union[int, str]  # unix epoch (accetta ISO-8601 legacy)
     campaign_id: Optional[int] = None
     opened: bool = False
     clicked: bool = False
@@ -45,20 +51,165 @@ class EmailSent:
     bounced: bool = False
 
 
+# Versione schema (PRAGMA user_version): 1 = timestamp dichiarati INTEGER
+_SCHEMA_VERSION = 1
+
+# Colonne timestamp (unix epoch INTEGER; TEXT ISO-8601 negli schemi precedenti)
+_TIMESTAMP_COLUMNS = {
+    'contacts': ('first_found', 'last_updated'),
+    'campaigns': ('created_at',),
+    'emails_sent': ('sent_at',),
+    'updates_log': ('updated_at',),
+}
+
+
+def _to_epoch(value: Union[int, str]) -> int:
+    """Converte un timestamp (epoch o ISO-8601 legacy) in secondi unix"""
+    if isinstance(value, str):
+        if value.isdigit():
+            # Epoch già convertito ma salvato in una colonna TEXT
+            return int(value)
+        return int(datetime.fromisoformat(value).timestamp())
+    return int(value)
+
+
+def _body_digest(body: str) -> bytes:
+    """Chiave content-addressed del corpo email"""
+    return hashlib.sha1(body.encode()).digest()
+
+
 class ContactDatabase:
     """Gestisce database contatti e campagne"""
     
-    def __init__(self, db_path: str = "data/contacts.db"):
+    def __init__(self, db_path: str = "data/contacts.db",
+                 read_replica_interval: Optional[float] = None):
         self.db_path = Path(db_path)
         self.db_path.parent.mkdir(parents=True, exist_ok=True)
         # Use check_same_thread=False for Streamlit compatibility
-        self.conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        # isolation_level=None: transazioni gestite esplicitamente (BEGIN IMMEDIATE)
+        self.conn = sqlite3.connect(
+            str(self.db_path), check_same_thread=False, isolation_level=None
+        )
         self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA busy_timeout = 5000")
+        # Cursore di scrittura riusato, serializzato dal lock (connessione condivisa)
+        self._write_cursor = self.conn.cursor()
+        self._write_lock = threading.RLock()
         self._create_tables()
+        
+        # Replica in memoria per dashboard read-mostly (opzionale)
+        self.read_conn = self.conn
+        self._read_replica = bool(read_replica_interval)
+        self._replica_interval = read_replica_interval or 0.0
+        self._replica_refreshed_at = 0.0
+        self._replica_stale = False
+        self._replica_stop = threading.Event()
+        self._replica_thread = None
+        if self._read_replica:
+            self._refresh_read_replica()
+            self._replica_thread = threading.Thread(
+                target=self._replica_loop, args=(read_replica_interval,), daemon=True
+            )
+            self._replica_thread.start()
+    
+    @contextmanager
+    def _write_transaction(self):
+        """Transazione di scrittura che prende subito il lock (BEGIN IMMEDIATE)"""
+        with self._write_lock:
+            self._write_cursor.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._write_cursor
+            except BaseException:
+                self.conn.rollback()
+                raise
+            else:
+                self.conn.commit()
+                self._replica_stale = self._read_replica
+    
+    def _refresh_read_replica(self):
+        """Copia il database su disco in una nuova connessione :memory:"""
+        replica = sqlite3.connect(":memory:", check_same_thread=False)
+        replica.row_factory = sqlite3.Row
+        with self._write_lock:
+            # close() già chiamato: connessione su disco chiusa, niente da copiare
+            if self._replica_stop.is_set():
+                replica.close()
+                return
+            self._replica_stale = False
+            self._replica_refreshed_at = time.monotonic()
+            self.conn.backup(replica)
+            # Swap atomico: le letture in corso finiscono sulla replica precedente
+            self.read_conn = replica
+    
+    def _replica_loop(self, interval: float):
+        """Riallinea periodicamente la replica (scritture di altri processi)"""
+        while not self._replica_stop.wait(interval):
+            self._refresh_read_replica()
+    
+    def _reader(self) -> sqlite3.Connection:
+        """Connessione per le letture: la replica, o il DB su disco se non include ancora le scritture locali"""
+        if self._replica_stale:
+            if time.monotonic() - self._replica_refreshed_at < self._replica_interval:
+                # Replica copiata da poco: niente nuova copia, le proprie scritture si leggono dal disco
+                return self.conn
+            self._refresh_read_replica()
+        return self.read_conn
+    
+    def _migrate_timestamp_columns(self, cursor: sqlite3.Cursor):
+        """Ricostruisce le tabelle con timestamp TEXT (schemi precedenti) come INTEGER"""
+        to_rebuild = {}
+        for table, timestamp_columns in _TIMESTAMP_COLUMNS.items():
+            declared = {
+                row['name']: row['type'] for row in cursor.execute(f"PRAGMA table_info({table})")
+            }
+            text_columns = [column for column in timestamp_columns if declared.get(column) == 'TEXT']
+            if text_columns:
+                to_rebuild[table] = (declared, text_columns)
+        if not to_rebuild:
+            return
+        
+        # I trigger esistenti (es. emails_sent_ai) citano le tabelle da ricostruire e farebbero
+        # fallire il RENAME: si eliminano tutti, _create_tables li ricrea subito dopo
+        triggers = cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'").fetchall()
+        for row in triggers:
+            cursor.execute(f"DROP TRIGGER {row['name']}")
+        
+        for table, (declared, text_columns) in to_rebuild.items():
+            # Stesso DDL originale (vincoli, default, FK) con i timestamp dichiarati INTEGER
+            create_sql = cursor.execute(
+                "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+            ).fetchone()['sql']
+            create_sql = re.sub(rf"\b{table}\b", f"{table}_new", create_sql, count=1)
+            for column in text_columns:
+                create_sql = re.sub(rf"\b{column}\s+TEXT\b", f"{column} INTEGER", create_sql)
+            cursor.execute(create_sql)
+            
+            columns = list(declared)
+            positions = [columns.index(column) for column in text_columns]
+            rows = []
+            for row in cursor.execute(f"SELECT {', '.join(columns)} FROM {table}"):
+                row = list(row)
+                for i in positions:
+                    row[i] = _to_epoch(row[i]) if row[i] not in (None, '') else None
+                rows.append(row)
+            cursor.executemany(
+                f"INSERT INTO {table}_new ({', '.join(columns)}) "
+                f"VALUES ({', '.join('?' * len(columns))})",
+                rows
+            )
+            # DROP elimina anche gli indici della tabella: vengono ricreati da _create_tables
+            cursor.execute(f"DROP TABLE {table}")
+            cursor.execute(f"ALTER TABLE {table}_new RENAME TO {table}")
     
     def _create_tables(self):
         """Crea schema database"""
         cursor = self.conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        
+        # Migrazione una tantum, prima di trigger e indici (la ricostruzione li eliminerebbe)
+        schema_version = cursor.execute("PRAGMA user_version").fetchone()[0]
+        if schema_version < 1:
+            self._migrate_timestamp_columns(cursor)
         
         # Tabella contatti
         cursor.execute("""
@@ -70,19 +221,58 @@ class ContactDatabase:
             organization TEXT,
             source_url TEXT,
             confidence REAL,
-            first_found TEXT,
-            last_updated TEXT,
+            first_found INTEGER,
+            last_updated INTEGER,
             status TEXT DEFAULT 'new',
             notes TEXT
         )
         """)
         
+        # Indice full-text su contatti (external content, sincronizzato via trigger)
+        fts_exists = cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'contacts_fts'"
+        ).fetchone()
+        cursor.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS contacts_fts USING fts5(
+            name, organization, role, email,
+            content='contacts', content_rowid='id'
+        )
+        """)
+        if not fts_exists:
+            # Popola l'indice con i contatti già presenti
+            cursor.execute("INSERT INTO contacts_fts(contacts_fts) VALUES ('rebuild')")
+        
+        cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS contacts_ai AFTER INSERT ON contacts
+        BEGIN
+            INSERT INTO contacts_fts(rowid, name, organization, role, email)
+            VALUES (NEW.id, NEW.name, NEW.organization, NEW.role, NEW.email);
+        END
+        """)
+        cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS contacts_ad AFTER DELETE ON contacts
+        BEGIN
+            INSERT INTO contacts_fts(contacts_fts, rowid, name, organization, role, email)
+            VALUES ('delete', OLD.id, OLD.name, OLD.organization, OLD.role, OLD.email);
+        END
+        """)
+        cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS contacts_au
+        AFTER UPDATE OF name, organization, role, email ON contacts
+        BEGIN
+            INSERT INTO contacts_fts(contacts_fts, rowid, name, organization, role, email)
+            VALUES ('delete', OLD.id, OLD.name, OLD.organization, OLD.role, OLD.email);
+            INSERT INTO contacts_fts(rowid, name, organization, role, email)
+            VALUES (NEW.id, NEW.name, NEW.organization, NEW.role, NEW.email);
+        END
+        """)
+        
         # Tabella campagne
         cursor.execute("""
         CREATE TABLE IF NOT EXISTS campaigns (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             name TEXT NOT NULL,
-            created_at TEXT,
+            created_at INTEGER,
             description TEXT,
             total_contacts INTEGER DEFAULT 0,
             emails_sent INTEGER DEFAULT 0,
@@ -92,6 +282,14 @@ class ContactDatabase:
         )
         """)
         
+        # Corpi email (content-addressed, fuori dalle righe scansionate)
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS email_bodies (
+            sha BLOB PRIMARY KEY,
+            body TEXT
+        )
+        """)
+        
         # Tabella email inviate
         cursor.execute("""
         CREATE TABLE IF NOT EXISTS emails_sent (
@@ -100,8 +298,8 @@ class ContactDatabase:
             contact_id INTEGER,
             email_to TEXT NOT NULL,
             subject TEXT,
-            body TEXT,
-            sent_at TEXT,
+            body_sha BLOB REFERENCES email_bodies(sha),
+            sent_at INTEGER,
             opened BOOLEAN DEFAULT 0,
             clicked BOOLEAN DEFAULT 0,
             responded BOOLEAN DEFAULT 0,
@@ -112,11 +310,101 @@ class ContactDatabase:
         )
         """)
         
+        # Migrazione: vecchio schema con body inline in emails_sent
+        columns = {row['name'] for row in cursor.execute("PRAGMA table_info(emails_sent)")}
+        if 'body' in columns:
+            cursor.execute(
+                "ALTER TABLE emails_sent ADD COLUMN body_sha BLOB REFERENCES email_bodies(sha)"
+            )
+            rows = cursor.execute(
+                "SELECT id, body FROM emails_sent WHERE body IS NOT NULL"
+            ).fetchall()
+            digests = [(row['id'], row['body'], _body_digest(row['body'])) for row in rows]
+            cursor.executemany(
+                "INSERT OR IGNORE INTO email_bodies (sha, body) VALUES (?, ?)",
+                [(sha, body) for _, body, sha in digests]
+            )
+            cursor.executemany(
+                "UPDATE emails_sent SET body_sha = ? WHERE id = ?",
+                [(sha, email_id) for email_id, _, sha in digests]
+            )
+            cursor.execute("ALTER TABLE emails_sent DROP COLUMN body")
+        
+        # Indice per follow-up: ultima email per contatto e range su sent_at
+        cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_emails_contact_sent
+        ON emails_sent(contact_id, sent_at)
+        """)
+        
+        # Rollup per campagna (materializzato via trigger, 0 = senza campagna)
+        rollup_exists = cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'campaign_rollup'"
+        ).fetchone()
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS campaign_rollup (
+            campaign_id INTEGER NOT NULL PRIMARY KEY,
+            sent INTEGER DEFAULT 0,
+            opened INTEGER DEFAULT 0,
+            clicked INTEGER DEFAULT 0,
+            responded INTEGER DEFAULT 0,
+            bounced INTEGER DEFAULT 0
+        )
+        """)
+        if not rollup_exists:
+            cursor.execute("""
+            INSERT INTO campaign_rollup (campaign_id, sent, opened, clicked, responded, bounced)
+            SELECT COALESCE(campaign_id, 0), COUNT(*), SUM(opened), SUM(clicked),
+                   SUM(responded), SUM(bounced)
+            FROM emails_sent
+            GROUP BY COALESCE(campaign_id, 0)
+            """)
+        
+        cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS campaign_rollup_ai
+        AFTER INSERT ON emails_sent
+        BEGIN
+            INSERT INTO campaign_rollup (campaign_id, sent, opened, clicked, responded, bounced)
+            VALUES (COALESCE(NEW.campaign_id, 0), 1, NEW.opened, NEW.clicked,
+                    NEW.responded, NEW.bounced)
+            ON CONFLICT(campaign_id) DO UPDATE SET
+                sent = sent + 1,
+                opened = opened + excluded.opened,
+                clicked = clicked + excluded.clicked,
+                responded = responded + excluded.responded,
+                bounced = bounced + excluded.bounced;
+        END
+        """)
+        cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS campaign_rollup_au
+        AFTER UPDATE OF opened, clicked, responded, bounced ON emails_sent
+        BEGIN
+            UPDATE campaign_rollup SET
+                opened = opened + NEW.opened - OLD.opened,
+                clicked = clicked + NEW.clicked - OLD.clicked,
+                responded = responded + NEW.responded - OLD.responded,
+                bounced = bounced + NEW.bounced - OLD.bounced
+            WHERE campaign_id = COALESCE(NEW.campaign_id, 0);
+        END
+        """)
+        cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS campaign_rollup_ad
+        AFTER DELETE ON emails_sent
+        BEGIN
+            UPDATE campaign_rollup SET
+                sent = sent - 1,
+                opened = opened - OLD.opened,
+                clicked = clicked - OLD.clicked,
+                responded = responded - OLD.responded,
+                bounced = bounced - OLD.bounced
+            WHERE campaign_id = COALESCE(OLD.campaign_id, 0);
+        END
+        """)
+        
         # Tabella log aggiornamenti
         cursor.execute("""
         CREATE TABLE IF NOT EXISTS updates_log (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
-            updated_at TEXT,
+            updated_at INTEGER,
             organization TEXT,
             new_contacts_found INTEGER,
             contacts_updated INTEGER,
@@ -124,46 +412,52 @@ class ContactDatabase:
         )
         """)
         
+        # Trigger: stato contatto e contatore campagna aggiornati dall'INSERT
+        cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS emails_sent_ai
+        AFTER INSERT ON emails_sent
+        BEGIN
+            UPDATE contacts SET status = 'contacted' WHERE id = NEW.contact_id;
+            UPDATE campaigns SET emails_sent = emails_sent + 1
+            WHERE id = NEW.campaign_id;
+        END
+        """)
+        
+        cursor.execute(f"PRAGMA user_version = {_SCHEMA_VERSION}")
         self.conn.commit()
     
     def add_contact(self, contact: Contact) -> int:
         """Aggiunge o aggiorna contatto"""
-        cursor = self.conn.cursor()
+        now = int(time.time())
         
-        now = datetime.now().isoformat()
+        # Anche il Contact di contact_hunter (senza timestamp né status): default se assenti o vuoti
+        last_updated = getattr(contact, 'last_updated', None) or now
+        first_found = getattr(contact, 'first_found', None) or now
+        status = getattr(contact, 'status', None) or "new"
         
-        # Set timestamps if not already set
-        if not hasattr(contact, 'last_updated') or not contact.last_updated:
-            contact.last_updated = now
-        if not hasattr(contact, 'first_found') or not contact.first_found:
-            contact.first_found = now
-        if not hasattr(contact, 'status') or not contact.status:
-            contact.status = "new"
-        
-        cursor.execute("""
-        INSERT INTO contacts (email, name, role, organization, source_url, 
-                            confidence, first_found, last_updated, status)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ON CONFLICT(email) DO UPDATE SET
-            name = COALESCE(excluded.name, name),
-            role = COALESCE(excluded.role, role),
-            confidence = excluded.confidence,
-            last_updated = excluded.last_updated
-        """, (
-            contact.email, contact.name, contact.role, contact.organization,
-            contact.source_url, contact.confidence, contact.first_found,
-            contact.last_updated, contact.status
-        ))
-        
-        self.conn.commit()
-        return cursor.lastrowid
+        with self._write_transaction() as cursor:
+            cursor.execute("""
+            INSERT INTO contacts (email, name, role, organization, source_url, 
+                                confidence, first_found, last_updated, status)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(email) DO UPDATE SET
+                name = COALESCE(excluded.name, name),
+                role = COALESCE(excluded.role, role),
+                confidence = excluded.confidence,
+                last_updated = excluded.last_updated
+            """, (
+                contact.email, contact.name, contact.role, contact.organization,
+                contact.source_url, contact.confidence, first_found,
+                last_updated, status
+            ))
+            return cursor.lastrowid
     
     def get_contacts(self, 
                     organization: Optional[str] = None,
                     status: Optional[str] = None,
                     min_confidence: float = 0.0) -> List[Dict]:
         """Recupera contatti con filtri"""
-        cursor = self.conn.cursor()
+        cursor = self._reader().cursor()
         
         query = "SELECT * FROM contacts WHERE confidence >= ?"
         params = [min_confidence]
@@ -181,59 +475,91 @@ class ContactDatabase:
         cursor.execute(query, params)
         return [dict(row) for row in cursor.fetchall()]
     
+    def search_contacts(self, query: str) -> List[Dict]:
+        """Ricerca full-text (per prefisso) su nome, organizzazione, ruolo ed email"""
+        terms = query.split()
+        if not terms:
+            return []
+        
+        # Ogni termine quotato come prefisso: evita errori di sintassi MATCH
+        match = " ".join('"' + term.replace('"', '""') + '"*' for term in terms)
+        
+        cursor = self._reader().cursor()
+        cursor.execute("""
+        SELECT c.* FROM contacts c
+        JOIN contacts_fts f ON f.rowid = c.id
+        WHERE contacts_fts MATCH ?
+        ORDER BY c.confidence DESC, c.last_updated DESC
+        """, (match,))
+        return [dict(row) for row in cursor.fetchall()]
+    
     def create_campaign(self, name: str, description: str = "") -> int:
         """Crea nuova campagna"""
-        cursor = self.conn.cursor()
-        cursor.execute("""
-        INSERT INTO campaigns (name, created_at, description)
-        VALUES (?, ?, ?)
-        """, (name, datetime.now().isoformat(), description))
-        
-        self.conn.commit()
-        return cursor.lastrowid
+        with self._write_transaction() as cursor:
+            cursor.execute("""
+            INSERT INTO campaigns (name, created_at, description)
+            VALUES (?, ?, ?)
+            """, (name, int(time.time()), description))
+            return cursor.lastrowid
     
     def log_email_sent(self, email_sent: EmailSent, contact_id: int):
-        """Registra email inviata"""
-        cursor = self.conn.cursor()
-        cursor.execute("""
-        INSERT INTO emails_sent (campaign_id, contact_id, email_to, subject, 
-                                body, sent_at, opened, clicked, responded, bounced)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            email_sent.campaign_id, contact_id, email_sent.email_to,
-            email_sent.subject, email_sent.body, email_sent.sent_at,
-            email_sent.opened, email_sent.clicked, email_sent.responded,
-            email_sent.bounced
-        ))
-        
-        # Aggiorna stato contatto
-        cursor.execute("""
-        UPDATE contacts SET status = 'contacted' WHERE id = ?
-        """, (contact_id,))
-        
-        # Aggiorna stats campagna
-        if email_sent.campaign_id:
+        """Registra email inviata (stato contatto e stats campagna via trigger)"""
+        body_sha = _body_digest(email_sent.body)
+        with self._write_transaction() as cursor:
+            cursor.execute(
+                "INSERT OR IGNORE INTO email_bodies (sha, body) VALUES (?, ?)",
+                (body_sha, email_sent.body)
+            )
             cursor.execute("""
-            UPDATE campaigns SET emails_sent = emails_sent + 1 
-            WHERE id = ?
-            """, (email_sent.campaign_id,))
+            INSERT INTO emails_sent (campaign_id, contact_id, email_to, subject, 
+                                    body_sha, sent_at, opened, clicked, responded, bounced)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (
+                email_sent.campaign_id, contact_id, email_sent.email_to,
+                email_sent.subject, body_sha, _to_epoch(email_sent.sent_at),
+                email_sent.opened, email_sent.clicked, email_sent.responded,
+                email_sent.bounced
+            ))
+    
+    def log_emails_sent(self, emails: List[Tuple[EmailSent, int]]):
+        """Registra un blocco di email inviate in un'unica transazione"""
+        # Stato contatti e stats campagne restano a carico del trigger emails_sent_ai
+        digests = [_body_digest(email_sent.body) for email_sent, _ in emails]
+        bodies = {sha: email_sent.body for sha, (email_sent, _) in zip(digests, emails)}
         
-        self.conn.commit()
+        with self._write_transaction() as cursor:
+            cursor.executemany(
+                "INSERT OR IGNORE INTO email_bodies (sha, body) VALUES (?, ?)",
+                bodies.items()
+            )
+            cursor.executemany("""
+            INSERT INTO emails_sent (campaign_id, contact_id, email_to, subject, 
+                                    body_sha, sent_at, opened, clicked, responded, bounced)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, [
+                (
+                    email_sent.campaign_id, contact_id, email_sent.email_to,
+                    email_sent.subject, body_sha, _to_epoch(email_sent.sent_at),
+                    email_sent.opened, email_sent.clicked, email_sent.responded,
+                    email_sent.bounced
+                )
+                for (email_sent, contact_id), body_sha in zip(emails, digests)
+            ])
     
     def log_update(self, organization: str, new_found: int, updated: int, notes: str = ""):
         """Registra aggiornamento settimanale"""
-        cursor = self.conn.cursor()
-        cursor.execute("""
-        INSERT INTO updates_log (updated_at, organization, new_contacts_found, 
-                                contacts_updated, notes)
-        VALUES (?, ?, ?, ?, ?)
-        """, (datetime.now().isoformat(), organization, new_found, updated, notes))
-        
-        self.conn.commit()
+        with self._write_transaction() as cursor:
+            cursor.execute("""
+            INSERT INTO updates_log (updated_at, organization, new_contacts_found, 
+                                    contacts_updated, notes)
+            VALUES (?, ?, ?, ?, ?)
+            """, (int(time.time()), organization, new_found, updated, notes))
     
     def get_contacts_needing_followup(self, days_since_sent: int = 7) -> List[Dict]:
         """Trova contatti che necessitano follow-up"""
-        cursor = self.conn.cursor()
+        cursor = self._reader().cursor()
+        # Cutoff calcolato in Python: confronto intero su sent_at usa l'indice
+        cutoff = int(time.time()) - days_since_sent * 86400
         cursor.execute("""
         SELECT c.*, e.sent_at, e.subject as last_subject
         FROM contacts c
@@ -241,20 +567,20 @@ class ContactDatabase:
         WHERE c.status = 'contacted'
         AND e.responded = 0
         AND e.bounced = 0
-        AND datetime(e.sent_at) <= datetime('now', '-' || ? || ' days')
+        AND e.sent_at <= ?
         AND NOT EXISTS (
             SELECT 1 FROM emails_sent e2 
             WHERE e2.contact_id = c.id 
             AND e2.sent_at > e.sent_at
         )
         ORDER BY e.sent_at ASC
-        """, (days_since_sent,))
+        """, (cutoff,))
         
         return [dict(row) for row in cursor.fetchall()]
     
     def get_stats(self) -> Dict:
         """Statistiche generali"""
-        cursor = self.conn.cursor()
+        cursor = self._reader().cursor()
         
         stats = {}
         
@@ -270,19 +596,16 @@ class ContactDatabase:
         """)
         stats['by_status'] = {row['status']: row['count'] for row in cursor.fetchall()}
         
-        # Email inviate
-        cursor.execute("SELECT COUNT(*) as total FROM emails_sent")
-        stats['total_emails_sent'] = cursor.fetchone()['total']
-        
-        # Tasso apertura
+        # Email inviate e tasso apertura (dal rollup, O(#campagne))
         cursor.execute("""
         SELECT 
-            SUM(CASE WHEN opened = 1 THEN 1 ELSE 0 END) as opened,
-            COUNT(*) as total
-        FROM emails_sent
+            COALESCE(SUM(opened), 0) as opened,
+            COALESCE(SUM(sent), 0) as total
+        FROM campaign_rollup
         """)
         row = cursor.fetchone()
-        if row and row['total'] > 0:
+        stats['total_emails_sent'] = row['total']
+        if row['total'] > 0:
             stats['open_rate'] = round(row['opened'] / row['total'] * 100, 1)
         else:
             stats['open_rate'] = 0.0
@@ -291,7 +614,14 @@ class ContactDatabase:
     
     def close(self):
         """Chiudi connessione"""
-        self.conn.close()
+        self._replica_stop.set()
+        # Attende il thread di refresh: nessun backup in corso sulla connessione che stiamo chiudendo
+        if self._replica_thread is not None:
+            self._replica_thread.join(timeout=5)
+        with self._write_lock:
+            if self.read_conn is not self.conn:
+                self.read_conn.close()
+            self.conn.close()
 
 
 if __name__ == "__main__":
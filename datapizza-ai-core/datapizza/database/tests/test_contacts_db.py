@@ -0,0 +1,301 @@
+import sqlite3
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+import pytest
+
+from datapizza.database.contacts_db import Contact, ContactDatabase, EmailSent
+
+# Schema originale (timestamp TEXT ISO-8601, body inline in emails_sent)
+BASELINE_SCHEMA = """
+CREATE TABLE contacts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    email TEXT UNIQUE NOT NULL,
+    name TEXT,
+    role TEXT,
+    organization TEXT,
+    source_url TEXT,
+    confidence REAL,
+    first_found TEXT,
+    last_updated TEXT,
+    status TEXT DEFAULT 'new',
+    notes TEXT
+);
+CREATE TABLE campaigns (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    created_at TEXT,
+    description TEXT,
+    total_contacts INTEGER DEFAULT 0,
+    emails_sent INTEGER DEFAULT 0,
+    emails_opened INTEGER DEFAULT 0,
+    emails_clicked INTEGER DEFAULT 0,
+    responses INTEGER DEFAULT 0
+);
+CREATE TABLE emails_sent (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    campaign_id INTEGER,
+    contact_id INTEGER,
+    email_to TEXT NOT NULL,
+    subject TEXT,
+    body TEXT,
+    sent_at TEXT,
+    opened BOOLEAN DEFAULT 0,
+    clicked BOOLEAN DEFAULT 0,
+    responded BOOLEAN DEFAULT 0,
+    bounced BOOLEAN DEFAULT 0,
+    response_text TEXT,
+    FOREIGN KEY (campaign_id) REFERENCES campaigns(id),
+    FOREIGN KEY (contact_id) REFERENCES contacts(id)
+);
+CREATE TABLE updates_log (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    updated_at TEXT,
+    organization TEXT,
+    new_contacts_found INTEGER,
+    contacts_updated INTEGER,
+    notes TEXT
+);
+"""
+
+FOUND = "2025-01-10T09:30:00"
+SENT = ["2025-02-01T10:00:00", "2025-02-02T11:15:00", "2025-02-03T12:30:00"]
+
+
+def _epoch(iso: str) -> int:
+    return int(datetime.fromisoformat(iso).timestamp())
+
+
+@pytest.fixture
+def baseline_db(tmp_path):
+    """Database creato dal codice originale, con timestamp ISO e corpi inline"""
+    path = tmp_path / "contacts.db"
+    conn = sqlite3.connect(path)
+    conn.executescript(BASELINE_SCHEMA)
+    conn.executemany(
+        "INSERT INTO contacts (email, name, organization, confidence, first_found, last_updated, status) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        [
+            ("curator@maxxi.art", "Maria Rossi", "Museo MAXXI Roma", 0.9, FOUND, FOUND, "contacted"),
+            ("info@triennale.org", "Luca Bianchi", "Triennale Milano", 0.7, FOUND, FOUND, "contacted"),
+        ],
+    )
+    conn.execute("INSERT INTO campaigns (name, created_at, emails_sent) VALUES ('Musei', ?, 3)", (FOUND,))
+    conn.executemany(
+        "INSERT INTO emails_sent (campaign_id, contact_id, email_to, subject, body, sent_at, opened) "
+        "VALUES (1, ?, ?, ?, ?, ?, ?)",
+        [
+            (1, "curator@maxxi.art", "Proposta", "Gentile curatore, ...", SENT[0], 1),
+            (2, "info@triennale.org", "Proposta", "Gentile curatore, ...", SENT[1], 0),
+            (1, "curator@maxxi.art", "Follow-up", "Le riscrivo per ...", SENT[2], 0),
+        ],
+    )
+    conn.execute(
+        "INSERT INTO updates_log (updated_at, organization, new_contacts_found, contacts_updated) "
+        "VALUES (?, 'Museo MAXXI Roma', 2, 0)",
+        (FOUND,),
+    )
+    conn.commit()
+    conn.close()
+    return path
+
+
+def test_baseline_db_migration_preserves_data(baseline_db):
+    db = ContactDatabase(str(baseline_db))
+    conn = db.conn
+
+    counts = {
+        table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        for table in ("contacts", "campaigns", "emails_sent", "updates_log")
+    }
+    assert counts == {"contacts": 2, "campaigns": 1, "emails_sent": 3, "updates_log": 1}
+
+    # Corpi spostati in email_bodies (deduplicati) e ancora raggiungibili per ogni email
+    bodies = conn.execute("""
+    SELECT e.id, b.body FROM emails_sent e JOIN email_bodies b ON b.sha = e.body_sha ORDER BY e.id
+    """).fetchall()
+    assert [row["body"] for row in bodies] == [
+        "Gentile curatore, ...", "Gentile curatore, ...", "Le riscrivo per ...",
+    ]
+    assert conn.execute("SELECT COUNT(*) FROM email_bodies").fetchone()[0] == 2
+    assert "body" not in {row["name"] for row in conn.execute("PRAGMA table_info(emails_sent)")}
+
+    stats = db.get_stats()
+    assert stats["total_contacts"] == 2
+    assert stats["total_emails_sent"] == 3
+    assert stats["open_rate"] == round(1 / 3 * 100, 1)
+
+    db.close()
+
+
+def test_baseline_timestamps_become_integer_columns(baseline_db):
+    db = ContactDatabase(str(baseline_db))
+    conn = db.conn
+
+    for table, column in (
+        ("contacts", "first_found"), ("contacts", "last_updated"), ("campaigns", "created_at"),
+        ("emails_sent", "sent_at"), ("updates_log", "updated_at"),
+    ):
+        declared = {row["name"]: row["type"] for row in conn.execute(f"PRAGMA table_info({table})")}
+        assert declared[column] == "INTEGER"
+        values = [row[0] for row in conn.execute(f"SELECT {column} FROM {table}")]
+        assert all(type(value) is int for value in values), (table, column, values)
+
+    sent_at = [row[0] for row in conn.execute("SELECT sent_at FROM emails_sent ORDER BY id")]
+    assert sent_at == [_epoch(iso) for iso in SENT]
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == 1
+
+    db.close()
+
+
+def test_epoch_strings_in_text_columns_come_back_as_ints(tmp_path):
+    """Epoch già convertiti ma ancora in colonne TEXT (valori restituiti come stringhe)"""
+    path = tmp_path / "contacts.db"
+    conn = sqlite3.connect(path)
+    conn.executescript(BASELINE_SCHEMA)
+    conn.execute(
+        "INSERT INTO contacts (email, confidence, first_found, last_updated) "
+        "VALUES ('a@b.it', 0.5, '1792173055', '1792173055')"
+    )
+    conn.commit()
+    conn.close()
+
+    db = ContactDatabase(str(path))
+    row = db.get_contacts()[0]
+    assert row["first_found"] == 1792173055
+    assert row["last_updated"] == 1792173055
+    db.close()
+
+
+def test_migrated_db_keeps_triggers_and_search(baseline_db):
+    ContactDatabase(str(baseline_db)).close()
+
+    # Seconda apertura: migrazione saltata, trigger e FTS ricreati funzionanti
+    db = ContactDatabase(str(baseline_db))
+    assert [row["email"] for row in db.search_contacts("maxxi")] == ["curator@maxxi.art"]
+
+    contact_id = db.add_contact(Contact(email="press@maxxi.art", organization="Museo MAXXI Roma"))
+    db.log_email_sent(
+        EmailSent(email_to="press@maxxi.art", subject="Proposta", body="Gentile curatore, ...",
+                  sent_at=SENT[2], campaign_id=1),
+        contact_id,
+    )
+    assert db.get_stats()["total_emails_sent"] == 4
+    assert db.get_contacts(status="contacted")[0]["status"] == "contacted"
+    assert {row["email"] for row in db.search_contacts("press")} == {"press@maxxi.art"}
+    assert db.conn.execute("SELECT COUNT(*) FROM email_bodies").fetchone()[0] == 2
+
+    db.close()
+
+
+def test_db_with_text_timestamps_and_triggers_is_rebuilt(baseline_db):
+    """DB aperto da versioni intermedie: colonne ancora TEXT ma trigger già creati"""
+    conn = sqlite3.connect(baseline_db)
+    conn.execute("""
+    CREATE TRIGGER emails_sent_ai AFTER INSERT ON emails_sent
+    BEGIN
+        UPDATE contacts SET status = 'contacted' WHERE id = NEW.contact_id;
+    END
+    """)
+    conn.commit()
+    conn.close()
+
+    db = ContactDatabase(str(baseline_db))
+    assert type(db.get_contacts()[0]["first_found"]) is int
+    assert db.get_stats()["total_emails_sent"] == 3
+    db.close()
+
+
+def test_fresh_db_returns_integer_timestamps(tmp_path):
+    db = ContactDatabase(str(tmp_path / "contacts.db"))
+    db.add_contact(Contact(email="curator@maxxi.art", first_found=1792173055, last_updated=1792173055))
+    db.log_update("Museo MAXXI Roma", 1, 0)
+
+    assert db.get_contacts()[0]["first_found"] == 1792173055
+    assert type(db.conn.execute("SELECT updated_at FROM updates_log").fetchone()[0]) is int
+    db.close()
+
+
+@dataclass
+class HunterContact:
+    """Stessi campi del Contact di contact_hunter: niente timestamp né status"""
+    email: str
+    name: Optional[str] = None
+    role: Optional[str] = None
+    organization: str = ""
+    source_url: str = ""
+    confidence: float = 0.0
+
+
+def _assert_hunter_contact_is_stored(db, contact):
+    db.add_contact(contact)
+
+    row = db.get_contacts()[0]
+    assert row["email"] == contact.email
+    assert row["status"] == "new"
+    assert type(row["first_found"]) is int and row["first_found"] == row["last_updated"]
+
+
+def test_add_contact_accepts_contacts_without_timestamps(tmp_path):
+    db = ContactDatabase(str(tmp_path / "contacts.db"))
+    _assert_hunter_contact_is_stored(db, HunterContact(email="curator@maxxi.art", confidence=0.8))
+    db.close()
+
+
+def test_add_contact_accepts_contact_hunter_contacts(tmp_path):
+    contact_hunter = pytest.importorskip("datapizza.agents.contact_hunter")
+    db = ContactDatabase(str(tmp_path / "contacts.db"))
+    _assert_hunter_contact_is_stored(db, contact_hunter.Contact(email="curator@maxxi.art", confidence=0.8))
+    db.close()
+
+
+def test_own_writes_are_visible_with_read_replica(tmp_path):
+    db = ContactDatabase(str(tmp_path / "contacts.db"), read_replica_interval=30)
+    assert db.get_contacts(status="new") == []
+
+    # Come il ciclo di ricerca della dashboard: dedup sui contatti appena scritti
+    for email in ("curator@maxxi.art", "info@triennale.org", "curator@maxxi.art"):
+        existing = {row["email"] for row in db.get_contacts(status="new")}
+        if email not in existing:
+            db.add_contact(HunterContact(email=email, confidence=0.5))
+
+    assert sorted(row["email"] for row in db.get_contacts(status="new")) == [
+        "curator@maxxi.art", "info@triennale.org",
+    ]
+    assert db.get_stats()["total_contacts"] == 2
+    db.close()
+
+
+def test_replica_copy_after_local_writes_is_rate_limited(tmp_path, monkeypatch):
+    db = ContactDatabase(str(tmp_path / "contacts.db"), read_replica_interval=30)
+    refreshes = []
+    refresh = db._refresh_read_replica
+    monkeypatch.setattr(db, "_refresh_read_replica", lambda: refreshes.append(1) or refresh())
+
+    # Scritture e letture ravvicinate: letture dal disco, nessuna copia prima dell'intervallo
+    for i in range(3):
+        db.add_contact(Contact(email=f"c{i}@maxxi.art", confidence=0.5))
+        assert len(db.get_contacts()) == i + 1
+    assert refreshes == []
+
+    monkeypatch.setattr(db, "_replica_refreshed_at", db._replica_refreshed_at - 30)
+    assert len(db.get_contacts()) == 3
+    assert refreshes == [1]
+    assert db._reader() is db.read_conn is not db.conn
+
+    db.close()
+
+
+def test_close_joins_replica_thread(tmp_path):
+    db = ContactDatabase(str(tmp_path / "contacts.db"), read_replica_interval=0.01)
+    thread = db._replica_thread
+    assert thread.is_alive()
+
+    db.close()
+
+    assert not thread.is_alive()
+    with pytest.raises(sqlite3.ProgrammingError):
+        db.conn.execute("SELECT 1")
+    # Refresh dopo close(): ignorato, nessun accesso alla connessione chiusa
+    db._refresh_read_replica()
@@ -15,16 +15,33 @@ Features:
 Autore: Antonio Mainenti
 """
 
+import re
 import sys
+import time
+import hashlib
+import asyncio
+import weakref
 from pathlib import Path
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional
-from dataclasses import dataclass, asdict
+from typing import List, Dict, Optional, Tuple
+from collections.abc import Callable, Iterable, Iterator
+from dataclasses import dataclass, asdict, field, fields, is_dataclass
 from enum import Enum
+from types import MappingProxyType
+from collections import defaultdict, deque
+from functools import cache, cached_property
 import json
 
+import numpy as np
+
+try:
+    import orjson  # opzionale: (de)serializzazione dello storico 2-5x più veloce
+except ImportError:
+    orjson = None
+
 # Import datapizza core Client interface (packages installed in editable mode)
-from datapizza.core.clients import Client
+from datapizza.core.clients import Client, ClientResponse
+from datapizza.type import TextBlock
 
 
 class MealType(Enum):
@@ -55,9 +72,519 @@ class DietaryGoal(Enum):
     SALUTE = "salute"
 
 
-@dataclass
+# Ingredienti di stagione per mese (costanti di modulo, allocate una sola volta)
+_SEASONAL_DB = {
+    "novembre": {
+        "verdure": ["cavolo nero", "cavolo verza", "broccoli", "cavolfiore", "zucca", 
+                   "carciofi", "spinaci", "radicchio rosso", "radicchio trevigiano", 
+                   "finocchi", "porri", "sedano rapa", "barbabietole", "carote", 
+                   "rape", "topinambur", "coste", "cicoria"],
+        "legumi": ["lenticchie", "ceci", "fagioli borlotti", "fagioli cannellini", 
+                  "fagioli neri", "piselli secchi", "fave secche"],
+        "cereali_integrali": ["riso integrale", "farro", "orzo", "quinoa", "grano saraceno", "avena"],
+        "frutta_secca": ["noci", "mandorle", "nocciole", "castagne"],
+        "altro": ["funghi porcini", "funghi champignon", "tartufo"]
+    },
+    "dicembre": {
+        "verdure": ["cavolo nero", "cavolo verza", "broccoli", "cavolfiore", "carciofi", 
+                   "spinaci", "radicchio", "finocchi", "porri", "sedano rapa", "carote"],
+        "legumi": ["lenticchie", "ceci", "fagioli borlotti", "fagioli cannellini", "piselli secchi"],
+        "cereali_integrali": ["riso integrale", "farro", "orzo", "quinoa", "avena"],
+        "frutta_secca": ["noci", "mandorle", "nocciole", "castagne"],
+        "altro": ["funghi", "tartufo"]
+    },
+    "gennaio": {
+        "verdure": ["cavolo nero", "cavolo cappuccio", "broccoli", "cavolfiore", "carciofi",
+                   "spinaci", "radicchio", "finocchi", "porri", "sedano rapa"],
+        "legumi": ["lenticchie", "ceci", "fagioli", "fave secche"],
+        "cereali_integrali": ["riso integrale", "farro", "orzo", "quinoa", "avena"],
+        "frutta_secca": ["noci", "mandorle", "nocciole"]
+    },
+    "febbraio": {
+        "verdure": ["carciofi", "finocchi", "radicchio", "spinaci", "cicoria", 
+                   "porri", "sedano", "cavolfiore", "cavolo cappuccio"],
+        "legumi": ["lenticchie", "ceci", "fagioli", "fave secche"],
+        "cereali_integrali": ["riso integrale", "farro", "orzo", "quinoa"],
+        "frutta_secca": ["mandorle", "noci"]
+    },
+    "marzo": {
+        "verdure": ["carciofi", "asparagi", "agretti", "fave fresche", "piselli freschi",
+                   "spinaci", "radicchio", "lattuga", "rucola"],
+        "legumi": ["fave fresche", "piselli freschi", "ceci", "lenticchie"],
+        "cereali_integrali": ["riso integrale", "farro", "orzo", "quinoa"]
+    },
+    "aprile": {
+        "verdure": ["asparagi", "carciofi", "fave fresche", "piselli freschi", "agretti",
+                   "spinaci", "lattuga", "rucola", "ravanelli"],
+        "legumi": ["fave fresche", "piselli freschi", "lenticchie", "ceci"],
+        "cereali_integrali": ["riso integrale", "farro", "orzo", "quinoa"]
+    },
+    "maggio": {
+        "verdure": ["asparagi", "fave", "piselli", "zucchine", "pomodori", "melanzane",
+                   "peperoni", "lattuga", "rucola", "ravanelli"],
+        "legumi": ["fave fresche", "piselli freschi", "fagiolini"],
+        "cereali_integrali": ["riso integrale", "farro", "orzo", "quinoa"]
+    },
+    "giugno": {
+        "verdure": ["zucchine", "pomodori", "melanzane", "peperoni", "cetrioli",
+                   "fagiolini", "lattuga", "rucola", "basilico"],
+        "legumi": ["fagiolini", "piselli", "lenticchie"],
+        "cereali_integrali": ["riso integrale", "farro", "orzo", "quinoa"]
+    },
+    "luglio": {
+        "verdure": ["pomodori", "zucchine", "melanzane", "peperoni", "cetrioli",
+                   "fagiolini", "lattuga", "rucola", "basilico"],
+        "legumi": ["fagiolini", "borlotti freschi"],
+        "cereali_integrali": ["riso integrale", "farro", "orzo"]
+    },
+    "agosto": {
+        "verdure": ["pomodori", "zucchine", "melanzane", "peperoni", "cetrioli",
+                   "fagiolini", "lattuga", "basilico"],
+        "legumi": ["fagioli freschi", "fagiolini"],
+        "cereali_integrali": ["riso integrale", "farro", "orzo"]
+    },
+    "settembre": {
+        "verdure": ["pomodori", "zucchine", "melanzane", "peperoni", "zucca",
+                   "funghi", "spinaci", "bietole", "radicchio"],
+        "legumi": ["fagioli freschi", "lenticchie", "ceci"],
+        "cereali_integrali": ["riso integrale", "farro", "orzo", "quinoa"]
+    },
+    "ottobre": {
+        "verdure": ["zucca", "cavolo", "broccoli", "cavolfiore", "spinaci", "bietole",
+                   "radicchio", "funghi", "finocchi"],
+        "legumi": ["lenticchie", "ceci", "fagioli borlotti", "fagioli cannellini"],
+        "cereali_integrali": ["riso integrale", "farro", "orzo", "quinoa"],
+        "altro": ["funghi porcini", "castagne"]
+    }
+}
+
+# Mesi in italiano indicizzati da datetime.month - 1
+MONTHS_IT = (
+    "gennaio", "febbraio", "marzo", "aprile", "maggio", "giugno",
+    "luglio", "agosto", "settembre", "ottobre", "novembre", "dicembre"
+)
+# Viste in sola lettura: le stesse istanze sono condivise da tutti gli agenti del processo
+_SEASONAL_BY_MONTH = tuple(
+    MappingProxyType({category: tuple(items) for category, items in _SEASONAL_DB[month].items()})
+    for month in MONTHS_IT
+)
+# Giorni della settimana in italiano indicizzati da datetime.weekday()
+WEEKDAYS_IT = ("lunedì", "martedì", "mercoledì", "giovedì", "venerdì", "sabato", "domenica")
+# Sezione del system prompt con gli ingredienti di stagione, già formattata per mese
+_SEASONAL_TEXT_BY_MONTH = tuple(
+    "".join(f"\n- {category.title()}: {', '.join(items)}" for category, items in seasonal.items())
+    for seasonal in _SEASONAL_BY_MONTH
+)
+
+# Requisiti per pasto, precalcolati per (tipo pasto, giorno di allenamento)
+_WHOLEGRAIN_RULES = (
+    "- Includi sempre una base tra: pane integrale, pasta integrale, riso integrale, cous cous integrale, farro, orzo, quinoa.\n"
+    "- Varia le verdure; non usare cavolo nero tutti i giorni.\n"
+    "- Per panini/sandwich non usare 'panino con farro': usa pane integrale.\n"
+)
+_BREAKFAST_RULES = (
+    "- Energetica ma leggera\n"
+    "- 300-500 calorie\n"
+    "- Proteine: 20-30g\n"
+    "- Stile italiano tendenzialmente dolce: yogurt greco, miele, tahina, avena/fiocchi d'avena, biscotti secchi, frutta secca (no frutta fresca)\n"
+    "- Evita uova/salato a colazione.\n"
+    "- Vietato usare quinoa a colazione.\n"
+)
+_DINNER_RULES = "- Leggera e digeribile\n- 400-600 calorie\n- Proteine: 30-40g\n" + _WHOLEGRAIN_RULES
+_SNACK_RULES = "- Leggero e nutriente\n- 150-250 calorie\n- Proteine: 10-15g\n"
+_POST_WORKOUT_RULES = "- Recovery focused\n- Proteine + carboidrati\n- 300-400 calorie\n- Proteine: 25-35g\n"
+_MEAL_REQUIREMENTS = {
+    (MealType.COLAZIONE, False): _BREAKFAST_RULES,
+    (MealType.COLAZIONE, True): _BREAKFAST_RULES,
+    (MealType.PRANZO, False): "- Bilanciata\n- 400-600 calorie\n- Proteine: 30-40g\n" + _WHOLEGRAIN_RULES,
+    (MealType.PRANZO, True): (
+        "- Bilanciata con focus su carboidrati complessi\n- 500-700 calorie\n- Proteine: 35-45g\n" + _WHOLEGRAIN_RULES
+    ),
+    (MealType.CENA, False): _DINNER_RULES,
+    (MealType.CENA, True): _DINNER_RULES,
+    (MealType.SPUNTINO_MATTINA, False): _SNACK_RULES,
+    (MealType.SPUNTINO_MATTINA, True): _SNACK_RULES,
+    (MealType.SPUNTINO_POMERIGGIO, False): _SNACK_RULES,
+    (MealType.SPUNTINO_POMERIGGIO, True): _SNACK_RULES,
+    (MealType.POST_WORKOUT, False): _POST_WORKOUT_RULES,
+    (MealType.POST_WORKOUT, True): _POST_WORKOUT_RULES,
+}
+
+# Parte statica finale del system prompt (regole, formato, ricetta d'esempio): uguale per ogni profilo
+_SYSTEM_PROMPT_TAIL = (
+    # Regole specifiche basate sul feedback utente
+    """
+REGOLE SPECIFICHE DA RISPETTARE (feedback utente):
+=================================================
+1) Colazione in stile italiano (tendenzialmente dolce):
+   - Preferisci yogurt greco, miele, tahina, avena/fiocchi d'avena, biscotti secchi tipo digestive/saraceni, frutta secca (datteri/fichi secchi) in piccole quantità.
+   - Evita colazioni salate con uova, spinaci, salumi o piatti da brunch anglosassone.
+   - NIENTE frutta fresca (l'utente non la consuma); per dolcezza usa miele o frutta secca.
+   - Quinoa: NON proporla a colazione.
+
+2) Panini e pane:
+   - Non esiste "panino con farro". Se proponi un panino/sandwich, usa pane integrale (o segale) come base.
+   - Se nella generazione compare "panino con farro", correggi in "panino con pane integrale".
+
+3) Varietà delle verdure (cavolo nero):
+   - Non usare cavolo nero tutti i giorni. Massimo 2 volte a settimana e non ripetuto più volte nello stesso giorno.
+   - Varia tra cavolo verza, bietole/coste, spinaci, cicoria, radicchio, broccoli, zucca, finocchi, ecc.
+
+4) Nomi autentici e coerenza culinaria:
+   - Evita nomi inventati o impropri (es: "cipolla alla romana"). Usa denominazioni tradizionali o descrittive precise.
+   - Correggi errori di ortografia ("spaghetti", "fagioli").
+
+5) Carboidrati complessi a pranzo e cena:
+   - Includi sempre una base tra: pane integrale, pasta integrale, riso integrale, cous cous integrale, farro, orzo, quinoa.
+
+6) Uova:
+   - Limite massimo 5–6 uova a settimana complessiva. In generale, non proporre uova a colazione per stile italiano.
+"""
+    """
+FORMATO RISPOSTA:
+=================
+Per ogni pasto genera un JSON strutturato con ESATTAMENTE questi campi:
+- recipe_name: nome ricetta appetitoso e descrittivo (es: "Zuppa di lenticchie e cavolo nero alla toscana", non "Zuppa")
+- ingredients: lista di oggetti [{"nome": "ingrediente", "quantità": "100g"}, ...]
+- instructions: lista di stringhe ["Passo 1...", "Passo 2...", ...]
+- calories: numero intero (calorie totali)
+- macros: {"proteine": X, "carboidrati": Y, "grassi": Z} in grammi (chiavi in italiano!)
+- prep_time: numero intero minuti preparazione
+- cooking_time: numero intero minuti cottura
+- seasonal_score: numero float 0.0-1.0 (quanto usa ingredienti stagionali)
+- notes: stringa con consigli per conservazione, varianti, meal prep
+
+LINEE GUIDA RICETTE AUTENTICHE:
+================================
+🇮🇹 **Ricette Italiane Tradizionali Rivisitate**
+- Rispetta le tecniche di cottura tradizionali italiane (soffritto, brasatura, etc)
+- Usa combinazioni di sapori classiche (pomodoro+basilico, rosmarino+aglio, salvia+burro)
+- Rivisita piatti classici in versione salutare (es: carbonara con yogurt greco)
+- Mantieni la struttura dei piatti regionali (zuppe toscane, risotti lombardi, paste siciliane)
+
+🌍 **Ricette Internazionali Autentiche**
+- Rispetta le combinazioni di spezie tipiche (curry indiano, ras el hanout marocchino)
+- Usa tecniche di cottura originali (stir-fry asiatico, slow cooking messicano)
+- Mantieni equilibri di sapori tradizionali (dolce-salato-acido asiatico)
+- Adatta ingredienti difficili con alternative locali stagionali
+
+📖 **Esperienza Culinaria e Coerenza**
+- Ogni ricetta deve avere una logica culinaria solida e testata
+- Tempi di cottura realistici basati su esperienza vera
+- Sequenza di preparazione logica: mise en place → cottura base → assemblaggio → finitura
+- Tecniche appropriate: soffritto per basi, rosolatura per proteine, mantecatura per cremosità
+- Bilanciamento sapori: salato, dolce, acido, amaro, umami
+- Temperature e modalità specifiche (fuoco medio, fiamma bassa, etc)
+
+🥘 **Praticità e Meal Prep**
+- Ricette batch-friendly: si possono preparare in quantità e conservare
+- Istruzioni chiare per conservazione (frigo 3-4 giorni, freezer 2-3 mesi)
+- Suggerimenti per riscaldamento ottimale senza perdere qualità
+- Varianti per diverse occasioni o ingredienti disponibili
+
+⚠️ **Errori da Evitare**
+- ❌ Combinazioni innaturali o fusion senza senso culinario
+- ❌ Tempi di cottura irrealistici (es: "cuocere legumi in 5 minuti")
+- ❌ Ingredienti incompatibili (yogurt in cottura lunga, limone con latte)
+- ❌ Procedure illogiche (spezie aggiunte a fine cottura quando vanno tostate all'inizio)
+- ❌ Quantità sproporzionate (troppo olio, troppe spezie, porzioni irreali)
+- ❌ Nomi generici: NO "Insalata", "Pasta", "Zuppa" → SÌ "Insalata di farro con ceci e rucola", "Penne integrali al pesto di cavolo nero"
+
+ESEMPIO RICETTA AUTENTICA:
+{
+  "recipe_name": "Zuppa di lenticchie e cavolo nero alla toscana",
+  "ingredients": [
+    {"nome": "lenticchie secche", "quantità": "200g"},
+    {"nome": "cavolo nero", "quantità": "150g"},
+    {"nome": "carote", "quantità": "100g"},
+    {"nome": "sedano", "quantità": "50g"},
+    {"nome": "cipolla", "quantità": "80g"},
+    {"nome": "pomodori pelati", "quantità": "200g"},
+    {"nome": "olio extravergine oliva", "quantità": "2 cucchiai"},
+    {"nome": "aglio", "quantità": "2 spicchi"},
+    {"nome": "rosmarino fresco", "quantità": "1 rametto"},
+    {"nome": "brodo vegetale", "quantità": "1 litro"},
+    {"nome": "sale", "quantità": "q.b."},
+    {"nome": "pepe nero", "quantità": "q.b."}
+  ],
+  "instructions": [
+    "Sciacquare le lenticchie sotto acqua corrente. Se usi lenticchie secche normali, metterle in ammollo 2 ore (le lenticchie rosse non servono ammollo)",
+    "Preparare un soffritto classico: in una pentola capiente scaldare l'olio a fuoco medio, aggiungere cipolla tritata fine, carote e sedano a cubetti piccoli. Cuocere 5-7 minuti mescolando fino a doratura leggera",
+    "Aggiungere aglio tritato e rosmarino spezzettato, far rosolare 1-2 minuti fino a quando profuma (attenzione a non bruciare l'aglio)",
+    "Unire i pomodori pelati schiacciati con una forchetta e far insaporire 3-4 minuti a fuoco medio-alto, mescolando",
+    "Aggiungere le lenticchie scolate e il brodo vegetale caldo. Portare a ebollizione vivace",
+    "Abbassare il fuoco a medio-basso, coprire con coperchio e cuocere 25-30 minuti (20 min per lenticchie rosse)",
+    "A 10 minuti dalla fine cottura, aggiungere il cavolo nero lavato e tagliato a striscioline sottili, mescolare bene",
+    "Assaggiare e aggiustare di sale e pepe. Se troppo denso, aggiungere poco brodo caldo",
+    "Servire ben calda con un filo d'olio extravergine a crudo e, se gradito, crostini di pane integrale"
+  ],
+  "calories": 420,
+  "macros": {"proteine": 24, "carboidrati": 58, "grassi": 10},
+  "prep_time": 20,
+  "cooking_time": 35,
+  "seasonal_score": 0.95,
+  "notes": "Piatto della tradizione toscana povera, nutriente e completo. Si conserva perfettamente in frigo 4 giorni in contenitore ermetico. Ideale per meal prep: riscaldare a fuoco dolce aggiungendo 2-3 cucchiai di brodo per riportare cremosità. Il sapore migliora il giorno dopo quando i sapori si amalgamano. Variante ribollita: aggiungere 50g di pasta corta integrale (ditalini) negli ultimi 10 minuti. Per versione cremosa: frullare metà zuppa e rimescolare. Freezer: congela benissimo, scongelare in frigo la sera prima."
+}
+
+⭐ GENERA RICETTE VERE, TESTATE, AUTENTICHE. Come se fossi uno chef professionista con 20 anni di esperienza in cucina italiana e internazionale. Ogni ricetta deve essere replicabile con successo da chiunque seguendo le tue istruzioni.
+"""
+    # Richiedi esplicitamente il JSON in un blocco di codice per facilitare il parsing
+    "\nATTENZIONE: Quando rispondi, restituisci SOLO il JSON della ricetta racchiuso all'interno di un blocco di codice con linguaggio 'json', ad esempio:\n```json\n{ ... }\n```\nNon inviare testo aggiuntivo prima o dopo il blocco di codice."
+)
+
+
+def _to_json_safe(obj):
+    """Converte enum/dataclass annidati in strutture serializzabili JSON"""
+    if isinstance(obj, (MealType, ActivityLevel, DietaryGoal)):
+        return obj.value
+    elif is_dataclass(obj) and not isinstance(obj, type):
+        # Dataclass con __slots__ non hanno __dict__
+        return {f.name: _to_json_safe(getattr(obj, f.name)) for f in fields(obj)}
+    elif hasattr(obj, '__dict__'):
+        return {k: _to_json_safe(v) for k, v in obj.__dict__.items()}
+    elif isinstance(obj, list):
+        return [_to_json_safe(item) for item in obj]
+    elif isinstance(obj, dict):
+        return {k: _to_json_safe(v) for k, v in obj.items()}
+    return obj
+
+
+def _history_line(record) -> bytes:
+    """Serializza un giorno dello storico come riga JSONL"""
+    if orjson is not None:
+        # orjson gestisce nativamente dict, enum e dataclass
+        return orjson.dumps(record, default=_to_json_safe, option=orjson.OPT_APPEND_NEWLINE)
+    return (json.dumps(_to_json_safe(record), ensure_ascii=False, separators=(',', ':')) + "\n").encode('utf-8')
+
+
+_json_loads = orjson.loads if orjson is not None else json.loads
+
+_JSON_DECODER = json.JSONDecoder()
+
+
+def _iter_json_objects(text: str, required_keys: Iterable[str]) -> Iterator[Dict]:
+    """Oggetti JSON validi con le chiavi richieste, ovunque nel testo (in ordine)"""
+    # raw_decode parte da un indice: nessuna copia del testo, fence e prosa ignorati
+    start = text.find('{')
+    while start != -1:
+        obj = None
+        if orjson is not None:
+            # Caso tipico (un oggetto per riga): la riga intera passa a orjson, senza raw_decode
+            line_end = text.find('\n', start)
+            line = text[start:line_end if line_end != -1 else len(text)].rstrip()
+            if line.endswith('}'):
+                try:
+                    obj, end = orjson.loads(line), start + len(line)
+                except orjson.JSONDecodeError:
+                    obj = None
+        if obj is None:
+            try:
+                obj, end = _JSON_DECODER.raw_decode(text, start)
+            except json.JSONDecodeError:
+                obj = None
+        if isinstance(obj, dict) and all(key in obj for key in required_keys):
+            yield obj
+            start = text.find('{', end)
+        else:
+            start = text.find('{', start + 1)
+
+
+# Blocco ```json {...}``` richiesto dal system prompt: lazy, si ferma alla prima chiusura del fence
+_JSON_BLOCK_RE = re.compile(r"```json\s*(\{.*?\})\s*```", re.DOTALL)
+
+
+# Campi minimi perché un oggetto JSON sia una ricetta
+_MEAL_REQUIRED_KEYS = frozenset(("recipe_name", "ingredients"))
+
+
+def _find_meal_json(text: str) -> Optional[Dict]:
+    """Primo oggetto JSON valido con i campi di una ricetta, ovunque nel testo"""
+    # Caso tipico: un solo blocco fenced, parsato in un colpo solo
+    match = _JSON_BLOCK_RE.search(text)
+    if match:
+        try:
+            obj = _json_loads(match.group(1))
+        except ValueError:
+            obj = None
+        if isinstance(obj, dict) and _MEAL_REQUIRED_KEYS.issubset(obj):
+            return obj
+    return next(_iter_json_objects(text, _MEAL_REQUIRED_KEYS), None)
+
+
+def _pick_meal(obj) -> Optional[Dict]:
+    """Ricetta contenuta in un valore JSON: il dict stesso o il primo elemento valido di una lista"""
+    if isinstance(obj, dict):
+        return obj if _MEAL_REQUIRED_KEYS.issubset(obj) else None
+    if isinstance(obj, list):
+        return next((item for item in obj if isinstance(item, dict) and _MEAL_REQUIRED_KEYS.issubset(item)), None)
+    return None
+
+
+def _iter_json_blocks(text: str) -> Iterator[str]:
+    """Blocchi {...} / [...] bilanciati di primo livello, in un'unica scansione lineare"""
+    depth = 0
+    start = 0
+    in_string = False
+    escaped = False
+    for i, char in enumerate(text):
+        if in_string:
+            # Parentesi dentro le stringhe non contano; rispetta gli escape \"
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char in '{[':
+            if depth == 0:
+                start = i
+            depth += 1
+        elif char in '}]':
+            if depth:
+                depth -= 1
+                if depth == 0:
+                    yield text[start:i + 1]
+        elif char == '"' and depth:
+            in_string = True
+
+
+# Riparazioni euristiche del JSON generato dall'LLM, compilate una volta sola
+_TRAILING_COMMA_RE = re.compile(r",\s*([}\]])")
+_BARE_KEY_RE = re.compile(r'([\{,\n\s])([A-Za-z0-9_]+)\s*:')
+_QUANTITY_FIXES = (
+    # "quantità": 100g -> "quantità": "100g"
+    (re.compile(r'("quantità"|"quantity")\s*:\s*([0-9]+\s*[a-zA-Z\.]+)'), r'\1: "\2"'),
+    # 1 cucchiaio, 2 cucchiai, 50 ml, 1/2 cucchiaino
+    (re.compile(r'("quantità"|"quantity")\s*:\s*([0-9]+\s*/?[0-9]*\s*[a-zA-ZàèéìòùÀÈÉÌÒÙ\.]+)'), r'\1: "\2"'),
+    # q.b. senza virgolette
+    (re.compile(r'("quantità"|"quantity")\s*:\s*(q\.b\.)'), r'\1: "q.b."'),
+    # decimali con virgola o punto (es. 0,5 cucchiaino)
+    (re.compile(r'("quantità"|"quantity")\s*:\s*([0-9]+[,\.]?[0-9]*\s*[a-zA-ZàèéìòùÀÈÉÌÒÙ\.]+)'), r'\1: "\2"'),
+)
+
+
+def _repair_json(candidate: str) -> str:
+    """Corregge gli errori JSON più comuni (apici, virgole finali, chiavi e quantità senza virgolette)"""
+    fixed = candidate.replace("'", '"')
+    fixed = _TRAILING_COMMA_RE.sub(r"\1", fixed)
+    fixed = _BARE_KEY_RE.sub(r'\1"\2":', fixed)
+    for pattern, replacement in _QUANTITY_FIXES:
+        fixed = pattern.sub(replacement, fixed)
+    return fixed
+
+
+# Quantità sommabili nella lista spesa: numero + unità opzionale (es. "150g", "0,5 l", "2 cucchiai")
+_QUANTITY_RE = re.compile(r'(\d+(?:[.,]\d+)?)\s*([^\W\d_]+)?')
+
+
+# Chiavi alternative usate dall'LLM per nome e quantità degli ingredienti (in ordine di preferenza)
+_INGREDIENT_NAME_KEYS = ("nome", "name", "ingrediente", "ingredient", "item")
+_INGREDIENT_QTY_KEYS = ("quantità", "quantity", "qty", "amount")
+
+
+def _first_present(data: Dict, keys: Tuple[str, ...], default):
+    """Primo valore non vuoto tra le chiavi indicate"""
+    return next((data[key] for key in keys if data.get(key)), default)
+
+
+def ingredient_name(ingredient: Dict, default: str = "ingrediente"):
+    """Nome di un ingrediente, qualunque chiave abbia usato l'LLM"""
+    return _first_present(ingredient, _INGREDIENT_NAME_KEYS, default)
+
+
+def ingredient_qty(ingredient: Dict, default: str = "q.b."):
+    """Quantità di un ingrediente, qualunque chiave abbia usato l'LLM"""
+    return _first_present(ingredient, _INGREDIENT_QTY_KEYS, default)
+
+
+def _merge_quantities(quantities: List[str]) -> str:
+    """Somma le quantità per unità; le altre restano in coda (q.b. una volta, le numeriche con ×N)"""
+    if len(quantities) == 1:
+        return quantities[0]
+    
+    totals: Dict[str, float] = {}
+    others: Dict[str, int] = {}
+    for quantity in quantities:
+        match = _QUANTITY_RE.fullmatch(quantity.strip())
+        if match:
+            unit = (match.group(2) or "").lower()
+            totals[unit] = totals.get(unit, 0.0) + float(match.group(1).replace(",", "."))
+        else:
+            # "2 spicchi grandi", "1/2 cucchiaino": non sommabili ma da contare a ogni occorrenza
+            others[quantity] = others.get(quantity, 0) + 1
+    
+    parts = []
+    for unit, total in totals.items():
+        total = int(total) if total.is_integer() else round(total, 2)
+        # Unità abbreviate attaccate al numero (150g), parole separate (2 cucchiai)
+        parts.append(f"{total}{unit}" if len(unit) <= 2 else f"{total} {unit}")
+    for quantity, count in others.items():
+        # Senza numeri (q.b., a piacere) ripeterle non aggiunge informazione
+        if count == 1 or not any(ch.isdigit() for ch in quantity):
+            parts.append(quantity)
+        else:
+            parts.append(f"{quantity} ×{count}")
+    return ", ".join(parts)
+
+
+# Giorni completi tenuti in memoria; il resto dello storico resta solo su disco
+_RECENT_DAYS = 30
+
+# Colonne numeriche dello storico (Struct-of-Arrays) per le analisi
+_TOTALS_COLUMNS = (
+    ("calories", np.float64),
+    ("protein", np.float64),
+    ("carbs", np.float64),
+    ("fats", np.float64),
+    ("is_workout_day", bool),
+    # Somma per giorno + numero pasti: media stagionale senza array irregolari
+    ("seasonal_score", np.float64),
+    ("meals", np.int64),
+)
+
+
+def _history_row(day: Dict) -> tuple:
+    """Valori numerici di un giorno dello storico, nell'ordine di _TOTALS_COLUMNS"""
+    macros = day.get("total_macros", {})
+    meals = day.get("meals", [])
+    return (
+        day.get("total_calories", 0),
+        macros.get("proteine", 0),
+        macros.get("carboidrati", 0),
+        macros.get("grassi", 0),
+        bool(day.get("is_workout_day")),
+        sum(meal.get("seasonal_score", 0) for meal in meals),
+        len(meals),
+    )
+
+
+def _history_columns(rows: List[tuple]) -> Dict[str, np.ndarray]:
+    """Trasforma righe di _history_row in colonne NumPy"""
+    columns = zip(*rows, strict=True) if rows else ((),) * len(_TOTALS_COLUMNS)
+    return {
+        name: np.array(column, dtype=dtype) for (name, dtype), column in zip(_TOTALS_COLUMNS, columns, strict=True)
+    }
+
+
+def _history_totals(history: Iterable[Dict]) -> Dict[str, np.ndarray]:
+    """Colonne numeriche dello storico (Struct-of-Arrays) per le analisi"""
+    return _history_columns([_history_row(day) for day in history])
+
+
+@cache
+def _load_antonio_guidelines() -> Optional[Dict]:
+    """Linee guida di profile_antonio, importate una sola volta per processo"""
+    # Import lazy: profile_antonio importa a sua volta questo modulo
+    try:
+        from profile_antonio import get_nutrition_guidelines_antonio
+    except ImportError:
+        return None
+    return get_nutrition_guidelines_antonio()
+
+
+@dataclass(frozen=True, slots=True)
 class UserProfile:
-    """Profilo utente per personalizzazione"""
+    """Profilo utente per personalizzazione (immutabile: usare dataclasses.replace)"""
     name: str
     age: int
     weight: float  # kg
@@ -66,10 +593,10 @@ class UserProfile:
     dietary_goal: DietaryGoal
     
     # Preferenze alimentari
-    preferred_foods: List[str]
-    disliked_foods: List[str]
-    allergies: List[str]
-    intolerances: List[str]
+    preferred_foods: Tuple[str, ...]
+    disliked_foods: Tuple[str, ...]
+    allergies: Tuple[str, ...]
+    intolerances: Tuple[str, ...]
     
     # Restrizioni dietetiche
     vegetarian: bool = False
@@ -78,17 +605,22 @@ class UserProfile:
     dairy_free: bool = False
     
     # Schedule
-    workout_days: List[str] = None  # ["lunedì", "mercoledì", "venerdì"]
+    workout_days: Tuple[str, ...] = ()  # ("lunedì", "mercoledì", "venerdì")
     workout_time: str = "mattina"  # mattina, pomeriggio, sera
-    meal_times: Dict[str, str] = None  # {"colazione": "07:00", "pranzo": "13:00", ...}
+    meal_times: Optional[Dict[str, str]] = field(default=None, hash=False)  # {"colazione": "07:00", ...}
     
     # Altro
     cooking_time_available: str = "medio"  # breve (15min), medio (30min), lungo (60min+)
     budget_level: str = "medio"  # basso, medio, alto
     meal_prep: bool = False  # Prepara pasti in anticipo?
+    
+    def __post_init__(self):
+        # Le liste passate dai chiamanti diventano tuple: profilo hashabile e non modificabile
+        for name in ("preferred_foods", "disliked_foods", "allergies", "intolerances", "workout_days"):
+            object.__setattr__(self, name, tuple(getattr(self, name) or ()))
 
 
-@dataclass
+@dataclass(slots=True)
 class MealPlan:
     """Piano pasto"""
     date: str
@@ -103,8 +635,24 @@ class MealPlan:
     notes: str = ""
     seasonal_score: float = 1.0  # 0-1, quanto usa ingredienti di stagione
     
+    def to_dict(self) -> Dict:
+        """Dict JSON-safe senza deep copy (a differenza di asdict)"""
+        return {
+            "date": self.date,
+            "meal_type": self.meal_type.value,
+            "recipe_name": self.recipe_name,
+            "ingredients": self.ingredients,
+            "instructions": self.instructions,
+            "calories": self.calories,
+            "macros": self.macros,
+            "prep_time": self.prep_time,
+            "cooking_time": self.cooking_time,
+            "notes": self.notes,
+            "seasonal_score": self.seasonal_score,
+        }
+
 
-@dataclass
+@dataclass(slots=True)
 class DailyPlan:
     """Piano giornaliero completo"""
     date: str
@@ -114,6 +662,52 @@ class DailyPlan:
     total_macros: Dict[str, float]
     shopping_list: List[str]
     notes: str = ""
+    
+    def to_dict(self) -> Dict:
+        """Dict JSON-safe per lo storico, senza deep copy (a differenza di asdict)"""
+        return {
+            "date": self.date,
+            "is_workout_day": self.is_workout_day,
+            "meals": [meal.to_dict() for meal in self.meals],
+            "total_calories": self.total_calories,
+            "total_macros": self.total_macros,
+            "shopping_list": self.shopping_list,
+            "notes": self.notes,
+        }
+
+
+def profile_to_json_bytes(profile: UserProfile) -> bytes:
+    """Esporta il profilo come JSON indentato (UTF-8)"""
+    if orjson is not None:
+        # orjson serializza direttamente la dataclass (enum come valore), senza la deep copy di asdict
+        return orjson.dumps(profile, option=orjson.OPT_INDENT_2)
+    return json.dumps(_to_json_safe(profile), indent=2, ensure_ascii=False).encode('utf-8')
+
+
+# Event loop delle API sincrone, uno per client LLM: i client async (AsyncOpenAI/httpx) restano
+# legati al loop su cui hanno aperto le connessioni, anche se più agenti condividono il client
+_SYNC_LOOPS = weakref.WeakKeyDictionary()
+
+
+def _run_sync(client: Client, coro, async_name: str):
+    """Esegue coro sull'event loop dedicato al client (mai uno nuovo per chiamata)"""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        pass
+    else:
+        coro.close()
+        raise RuntimeError(
+            f"Event loop già attivo: usa 'await NutritionAgent.{async_name}(...)' invece della versione sincrona"
+        )
+    
+    loop = _SYNC_LOOPS.get(client)
+    if loop is None or loop.is_closed():
+        loop = asyncio.new_event_loop()
+        _SYNC_LOOPS[client] = loop
+        # Il loop vive quanto il client che lo usa
+        weakref.finalize(client, loop.close)
+    return loop.run_until_complete(coro)
 
 
 class NutritionAgent:
@@ -121,7 +715,9 @@ class NutritionAgent:
     Agente AI per pianificazione nutrizionale personalizzata.
     """
     
-    def __init__(self, google_client: Client, user_profile: UserProfile, data_dir: str = "data/nutrition"):
+    def __init__(self, google_client: Client, user_profile: UserProfile, data_dir: str = "data/nutrition",
+                 use_meal_cache: bool = True, max_parallel_requests: int = 6, meal_cache_ttl_days: int = 7,
+                 include_snacks: bool = True):
         """
         Inizializza Nutrition Agent.
         
@@ -129,145 +725,135 @@ class NutritionAgent:
             google_client: Client LLM compatibile (Google, OpenAI-like, Ollama, ecc.)
             user_profile: Profilo utente con preferenze
             data_dir: Directory per salvare dati
+            use_meal_cache: Riusa le ricette già generate per stesso pasto/data/tipo di giornata/profilo
+            max_parallel_requests: Massimo di richieste LLM contemporanee (rate limit del provider)
+            meal_cache_ttl_days: Giorni dopo i quali una ricetta in cache viene rigenerata
+            include_snacks: False per 3 pasti al giorno (senza spuntini di metà mattina e pomeriggio)
         """
         self.client = google_client
         self.profile = user_profile
+        self.include_snacks = include_snacks
         self.data_dir = Path(data_dir)
         self.data_dir.mkdir(parents=True, exist_ok=True)
         
-        # Carica o crea storico pasti
-        self.meal_history_file = self.data_dir / "meal_history.json"
-        self.meal_history = self._load_meal_history()
-        
-        # Carica ingredienti stagionali
-        self.seasonal_ingredients = self._get_seasonal_ingredients()
-    
-    def _load_meal_history(self) -> List[Dict]:
-        """Carica storico pasti precedenti"""
-        if self.meal_history_file.exists():
-            with open(self.meal_history_file, 'r') as f:
-                return json.load(f)
-        return []
-    
-    def _save_meal_history(self):
-        """Salva storico pasti"""
-        # Converti oggetti non serializzabili in JSON-friendly format
-        def convert_to_json_safe(obj):
-            if isinstance(obj, MealType):
-                return obj.value
-            elif isinstance(obj, (ActivityLevel, DietaryGoal)):
-                return obj.value
-            elif hasattr(obj, '__dict__'):
-                return {k: convert_to_json_safe(v) for k, v in obj.__dict__.items()}
-            elif isinstance(obj, list):
-                return [convert_to_json_safe(item) for item in obj]
-            elif isinstance(obj, dict):
-                return {k: convert_to_json_safe(v) for k, v in obj.items()}
-            return obj
+        # Storico pasti (JSON Lines, un giorno per riga, append-only): letto solo al primo accesso
+        self.meal_history_file = self.data_dir / "meal_history.jsonl"
+        self._recent: Optional[deque] = None
+        self._totals: Optional[Dict[str, np.ndarray]] = None
+        self._history: Optional[List[Dict]] = None  # storico completo, parsato solo se richiesto
+        self._migrate_legacy_history()
         
-        safe_history = convert_to_json_safe(self.meal_history)
-        
-        with open(self.meal_history_file, 'w') as f:
-            json.dump(safe_history, f, indent=2, ensure_ascii=False)
-    
-    def _get_seasonal_ingredients(self) -> Dict[str, List[str]]:
-        """Restituisce ingredienti di stagione per mese"""
-        seasonal_db = {
-            "novembre": {
-                "verdure": ["cavolo nero", "cavolo verza", "broccoli", "cavolfiore", "zucca", 
-                           "carciofi", "spinaci", "radicchio rosso", "radicchio trevigiano", 
-                           "finocchi", "porri", "sedano rapa", "barbabietole", "carote", 
-                           "rape", "topinambur", "coste", "cicoria"],
-                "legumi": ["lenticchie", "ceci", "fagioli borlotti", "fagioli cannellini", 
-                          "fagioli neri", "piselli secchi", "fave secche"],
-                "cereali_integrali": ["riso integrale", "farro", "orzo", "quinoa", "grano saraceno", "avena"],
-                "frutta_secca": ["noci", "mandorle", "nocciole", "castagne"],
-                "altro": ["funghi porcini", "funghi champignon", "tartufo"]
-            },
-            "dicembre": {
-                "verdure": ["cavolo nero", "cavolo verza", "broccoli", "cavolfiore", "carciofi", 
-                           "spinaci", "radicchio", "finocchi", "porri", "sedano rapa", "carote"],
-                "legumi": ["lenticchie", "ceci", "fagioli borlotti", "fagioli cannellini", "piselli secchi"],
-                "cereali_integrali": ["riso integrale", "farro", "orzo", "quinoa", "avena"],
-                "frutta_secca": ["noci", "mandorle", "nocciole", "castagne"],
-                "altro": ["funghi", "tartufo"]
-            },
-            "gennaio": {
-                "verdure": ["cavolo nero", "cavolo cappuccio", "broccoli", "cavolfiore", "carciofi",
-                           "spinaci", "radicchio", "finocchi", "porri", "sedano rapa"],
-                "legumi": ["lenticchie", "ceci", "fagioli", "fave secche"],
-                "cereali_integrali": ["riso integrale", "farro", "orzo", "quinoa", "avena"],
-                "frutta_secca": ["noci", "mandorle", "nocciole"]
-            },
-            "febbraio": {
-                "verdure": ["carciofi", "finocchi", "radicchio", "spinaci", "cicoria", 
-                           "porri", "sedano", "cavolfiore", "cavolo cappuccio"],
-                "legumi": ["lenticchie", "ceci", "fagioli", "fave secche"],
-                "cereali_integrali": ["riso integrale", "farro", "orzo", "quinoa"],
-                "frutta_secca": ["mandorle", "noci"]
-            },
-            "marzo": {
-                "verdure": ["carciofi", "asparagi", "agretti", "fave fresche", "piselli freschi",
-                           "spinaci", "radicchio", "lattuga", "rucola"],
-                "legumi": ["fave fresche", "piselli freschi", "ceci", "lenticchie"],
-                "cereali_integrali": ["riso integrale", "farro", "orzo", "quinoa"]
-            },
-            "aprile": {
-                "verdure": ["asparagi", "carciofi", "fave fresche", "piselli freschi", "agretti",
-                           "spinaci", "lattuga", "rucola", "ravanelli"],
-                "legumi": ["fave fresche", "piselli freschi", "lenticchie", "ceci"],
-                "cereali_integrali": ["riso integrale", "farro", "orzo", "quinoa"]
-            },
-            "maggio": {
-                "verdure": ["asparagi", "fave", "piselli", "zucchine", "pomodori", "melanzane",
-                           "peperoni", "lattuga", "rucola", "ravanelli"],
-                "legumi": ["fave fresche", "piselli freschi", "fagiolini"],
-                "cereali_integrali": ["riso integrale", "farro", "orzo", "quinoa"]
-            },
-            "giugno": {
-                "verdure": ["zucchine", "pomodori", "melanzane", "peperoni", "cetrioli",
-                           "fagiolini", "lattuga", "rucola", "basilico"],
-                "legumi": ["fagiolini", "piselli", "lenticchie"],
-                "cereali_integrali": ["riso integrale", "farro", "orzo", "quinoa"]
-            },
-            "luglio": {
-                "verdure": ["pomodori", "zucchine", "melanzane", "peperoni", "cetrioli",
-                           "fagiolini", "lattuga", "rucola", "basilico"],
-                "legumi": ["fagiolini", "borlotti freschi"],
-                "cereali_integrali": ["riso integrale", "farro", "orzo"]
-            },
-            "agosto": {
-                "verdure": ["pomodori", "zucchine", "melanzane", "peperoni", "cetrioli",
-                           "fagiolini", "lattuga", "basilico"],
-                "legumi": ["fagioli freschi", "fagiolini"],
-                "cereali_integrali": ["riso integrale", "farro", "orzo"]
-            },
-            "settembre": {
-                "verdure": ["pomodori", "zucchine", "melanzane", "peperoni", "zucca",
-                           "funghi", "spinaci", "bietole", "radicchio"],
-                "legumi": ["fagioli freschi", "lenticchie", "ceci"],
-                "cereali_integrali": ["riso integrale", "farro", "orzo", "quinoa"]
-            },
-            "ottobre": {
-                "verdure": ["zucca", "cavolo", "broccoli", "cavolfiore", "spinaci", "bietole",
-                           "radicchio", "funghi", "finocchi"],
-                "legumi": ["lenticchie", "ceci", "fagioli borlotti", "fagioli cannellini"],
-                "cereali_integrali": ["riso integrale", "farro", "orzo", "quinoa"],
-                "altro": ["funghi porcini", "castagne"]
-            }
-        }
+        # Cache ricette: memoria + disco (un file JSON per chiave)
+        self.use_meal_cache = use_meal_cache
+        self._meal_cache_dir = self.data_dir / "meal_cache"
+        self._meal_cache: Dict[str, Tuple[float, Dict]] = {}
+        self._meal_cache_ttl = meal_cache_ttl_days * 86400
+        self._pending_meals: Dict[str, asyncio.Task] = {}
         
-        current_month = datetime.now().strftime("%B").lower()
-        # Map inglese -> italiano
-        month_map = {
-            "january": "gennaio", "february": "febbraio", "march": "marzo",
-            "april": "aprile", "may": "maggio", "june": "giugno",
-            "july": "luglio", "august": "agosto", "september": "settembre",
-            "october": "ottobre", "november": "novembre", "december": "dicembre"
-        }
-        current_month_it = month_map.get(current_month, "novembre")
+        # Limite di concorrenza sulle chiamate LLM (semaforo legato all'event loop corrente)
+        self.max_parallel_requests = max(1, max_parallel_requests)
+        self._request_slots: Optional[asyncio.Semaphore] = None
+        self._request_slots_loop = None
+        
+        # Carica ingredienti stagionali (e il relativo testo per il prompt, già formattato)
+        month_index = datetime.now().month - 1
+        self.seasonal_ingredients = _SEASONAL_BY_MONTH[month_index]
+        self._seasonal_text = _SEASONAL_TEXT_BY_MONTH[month_index]
         
-        return seasonal_db.get(current_month_it, seasonal_db["novembre"])
+        # System prompt: dipende solo da profilo e mese, costruito una volta (qui, non alla prima richiesta)
+        _ = self.system_prompt
+    
+    @property
+    def profile(self) -> UserProfile:
+        """Profilo utente (immutabile: per cambiarlo si assegna un nuovo profilo)"""
+        return self._profile
+    
+    @profile.setter
+    def profile(self, user_profile: UserProfile):
+        self._profile = user_profile
+        self._workout_days = frozenset(user_profile.workout_days)
+        # Invalida i valori derivati dal profilo: verranno ricalcolati al prossimo accesso
+        self.__dict__.pop('system_prompt', None)
+        self.__dict__.pop('_profile_digest', None)
+    
+    @property
+    def meal_history(self) -> List[Dict]:
+        """Storico completo, letto dal disco solo al primo accesso (poi aggiornato in memoria)"""
+        if self._history is None:
+            self._history = list(self.iter_meal_history())
+        return list(self._history)
+    
+    @meal_history.setter
+    def meal_history(self, history: List[Dict]):
+        self._save_meal_history(history)
+    
+    @property
+    def history_days(self) -> int:
+        """Numero di giorni nello storico"""
+        self._ensure_meal_history()
+        return len(self._totals["calories"])
+    
+    @property
+    def total_meals(self) -> int:
+        """Numero di pasti nello storico"""
+        self._ensure_meal_history()
+        return int(self._totals["meals"].sum())
+    
+    def recent_history(self, days: int = _RECENT_DAYS) -> List[Dict]:
+        """Ultimi giorni dello storico (al massimo _RECENT_DAYS), senza rileggere il file"""
+        self._ensure_meal_history()
+        return list(self._recent)[-days:] if days > 0 else []
+    
+    def iter_meal_history(self) -> Iterator[Dict]:
+        """Itera lo storico riga per riga senza caricarlo tutto in memoria"""
+        if not self.meal_history_file.exists():
+            return
+        with open(self.meal_history_file, 'rb') as f:
+            for line in f:
+                if line.strip():
+                    yield _json_loads(line)
+    
+    def _migrate_legacy_history(self):
+        """Converte il vecchio formato JSON (lista completa riscritta ad ogni salvataggio)"""
+        legacy_file = self.meal_history_file.with_suffix(".json")
+        if not self.meal_history_file.exists() and legacy_file.exists():
+            with open(legacy_file, 'rb') as f:
+                self._save_meal_history(_json_loads(f.read()))
+    
+    def _ensure_meal_history(self):
+        """Carica lo storico alla prima richiesta: chi genera soltanto non legge mai il file"""
+        if self._totals is None:
+            self._load_meal_history()
+    
+    def _load_meal_history(self):
+        """Carica storico pasti in streaming: ultimi giorni + colonne numeriche"""
+        self._recent = deque(maxlen=_RECENT_DAYS)
+        rows = []
+        for day in self._history if self._history is not None else self.iter_meal_history():
+            self._recent.append(day)
+            rows.append(_history_row(day))
+        self._totals = _history_columns(rows)
+    
+    def _save_meal_history(self, history: Optional[List[Dict]] = None):
+        """Riscrive l'intero storico pasti (es. dopo una cancellazione)"""
+        history = self.meal_history if history is None else list(history)
+        with open(self.meal_history_file, 'wb') as f:
+            f.writelines(_history_line(day) for day in history)
+        self._history = history
+        self._recent = deque(history, maxlen=_RECENT_DAYS)
+        self._totals = _history_totals(history)
+    
+    def _append_meal_history(self, plan_dicts: List[Dict]):
+        """Aggiunge giorni in coda allo storico: O(nuovi giorni), una sola apertura del file"""
+        with open(self.meal_history_file, 'ab') as f:
+            f.writelines(_history_line(plan_dict) for plan_dict in plan_dicts)
+        if self._history is not None:
+            self._history.extend(plan_dicts)
+    
+    @cached_property
+    def system_prompt(self) -> str:
+        """System prompt in cache (invalidato quando si assegna un nuovo profilo)"""
+        return self._build_system_prompt()
     
     def _build_system_prompt(self) -> str:
         """Costruisce system prompt personalizzato"""
@@ -275,11 +861,7 @@ class NutritionAgent:
         # Carica linee guida specifiche utente se disponibili
         user_guidelines = None
         if self.profile.name.lower() == "antonio":
-            try:
-                from profile_antonio import get_nutrition_guidelines_antonio
-                user_guidelines = get_nutrition_guidelines_antonio()
-            except ImportError:
-                pass
+            user_guidelines = _load_antonio_guidelines()
         
         dietary_restrictions = []
         if self.profile.vegetarian:
@@ -293,12 +875,10 @@ class NutritionAgent:
         
         restrictions_text = ", ".join(dietary_restrictions) if dietary_restrictions else "nessuna restrizione"
         
-        # Ingredienti stagionali
-        seasonal_text = ""
-        for category, items in self.seasonal_ingredients.items():
-            seasonal_text += f"\n- {category.title()}: {', '.join(items)}"
+        # Ingredienti stagionali (testo precalcolato per mese)
+        seasonal_text = self._seasonal_text
         
-        prompt = f"""Sei un esperto nutrizionista AI specializzato in pianificazione pasti personalizzata.
+        parts = [f"""Sei un esperto nutrizionista AI specializzato in pianificazione pasti personalizzata.
 
 PROFILO UTENTE:
 ===============
@@ -327,22 +907,21 @@ Meal prep: {'Sì' if self.profile.meal_prep else 'No'}
 
 INGREDIENTI DI STAGIONE (mese corrente):
 =========================================={seasonal_text}
-"""
+"""]
 
         # Aggiungi linee guida personalizzate se disponibili
         if user_guidelines:
-            prompt += f"""
+            parts.append(f"""
 FILOSOFIA ALIMENTARE UTENTE:
 ============================
 {user_guidelines['philosophy']}
 
 PRIORITÀ ASSOLUTE (da rispettare sempre):
 ==========================================
-"""
-            for i, priority in enumerate(user_guidelines['priorities'], 1):
-                prompt += f"{i}. {priority}\n"
+""")
+            parts.extend(f"{i}. {priority}\n" for i, priority in enumerate(user_guidelines['priorities'], 1))
             
-            prompt += f"""
+            parts.append(f"""
 TARGET MACRONUTRIENTI GIORNALIERI:
 ===================================
 {user_guidelines['macros_target']['note']}
@@ -361,11 +940,10 @@ Spuntini: {user_guidelines['meal_structure']['spuntini']}
 MEAL PREP E BATCH COOKING:
 ===========================
 L'utente ama il meal prep. Suggerisci ricette che permettano:
-"""
-            for strategy in user_guidelines['batch_cooking']:
-                prompt += f"- {strategy}\n"
+""")
+            parts.extend(f"- {strategy}\n" for strategy in user_guidelines['batch_cooking'])
             
-            prompt += f"""
+            parts.append(f"""
 NUTRIZIONE PRE/POST WORKOUT:
 =============================
 Pre-workout: {user_guidelines['workout_nutrition']['pre_workout']}
@@ -375,37 +953,35 @@ Circuiti intensi: {user_guidelines['workout_nutrition']['circuiti_intensi']}
 FOCUS STAGIONALE:
 =================
 Ingredienti prioritari questo mese:
-"""
+""")
             # seasonal_focus è un dict con chiavi come "novembre"
-            for month_key, items in user_guidelines['seasonal_focus'].items():
-                for item_desc in items:
-                    prompt += f"- {item_desc}\n"
+            parts.extend(
+                f"- {item_desc}\n" for items in user_guidelines['seasonal_focus'].values() for item_desc in items
+            )
             
-            prompt += f"""
+            parts.append(f"""
 BUDGET E RISPARMIO:
 ===================
-"""
-            for tip in user_guidelines['budget_tips']:
-                prompt += f"- {tip}\n"
+""")
+            parts.extend(f"- {tip}\n" for tip in user_guidelines['budget_tips'])
             
-            prompt += f"""
+            parts.append(f"""
 ⚠️  CIBI DA EVITARE ASSOLUTAMENTE:
 ===================================
-"""
-            for avoid in user_guidelines['avoid_completely']:
-                prompt += f"❌ {avoid}\n"
+""")
+            parts.extend(f"❌ {avoid}\n" for avoid in user_guidelines['avoid_completely'])
             
-            prompt += """
+            parts.append("""
 IMPORTANTE: L'utente NON mangia frutta fresca di nessun tipo. 
 Quando servirebbero dolcificanti naturali o fibre dolci, usa:
 - Frutta secca (datteri, fichi secchi) in piccole quantità
 - Verdure dolci (carote, zucca, barbabietole)
 - Miele (con moderazione)
 Mai suggerire frutta fresca come spuntino o dessert!
-"""
+""")
         else:
             # Linee guida generiche
-            prompt += """
+            parts.append("""
 LINEE GUIDA GENERALI:
 =====================
 1. Prioritizza ingredienti di stagione e locali
@@ -418,162 +994,110 @@ LINEE GUIDA GENERALI:
 8. Varia i pasti per evitare monotonia
 9. Considera il budget dell'utente
 10. Se meal prep: suggerisci ricette batch-friendly
-"""
-
-        # Regole specifiche basate sul feedback utente
-        prompt += """
-REGOLE SPECIFICHE DA RISPETTARE (feedback utente):
-=================================================
-1) Colazione in stile italiano (tendenzialmente dolce):
-   - Preferisci yogurt greco, miele, tahina, avena/fiocchi d'avena, biscotti secchi tipo digestive/saraceni, frutta secca (datteri/fichi secchi) in piccole quantità.
-   - Evita colazioni salate con uova, spinaci, salumi o piatti da brunch anglosassone.
-   - NIENTE frutta fresca (l'utente non la consuma); per dolcezza usa miele o frutta secca.
-   - Quinoa: NON proporla a colazione.
-
-2) Panini e pane:
-   - Non esiste "panino con farro". Se proponi un panino/sandwich, usa pane integrale (o segale) come base.
-   - Se nella generazione compare "panino con farro", correggi in "panino con pane integrale".
-
-3) Varietà delle verdure (cavolo nero):
-   - Non usare cavolo nero tutti i giorni. Massimo 2 volte a settimana e non ripetuto più volte nello stesso giorno.
-   - Varia tra cavolo verza, bietole/coste, spinaci, cicoria, radicchio, broccoli, zucca, finocchi, ecc.
-
-4) Nomi autentici e coerenza culinaria:
-   - Evita nomi inventati o impropri (es: "cipolla alla romana"). Usa denominazioni tradizionali o descrittive precise.
-   - Correggi errori di ortografia ("spaghetti", "fagioli").
-
-5) Carboidrati complessi a pranzo e cena:
-   - Includi sempre una base tra: pane integrale, pasta integrale, riso integrale, cous cous integrale, farro, orzo, quinoa.
-
-6) Uova:
-   - Limite massimo 5–6 uova a settimana complessiva. In generale, non proporre uova a colazione per stile italiano.
-"""
-
-        prompt += """
-FORMATO RISPOSTA:
-=================
-Per ogni pasto genera un JSON strutturato con ESATTAMENTE questi campi:
-- recipe_name: nome ricetta appetitoso e descrittivo (es: "Zuppa di lenticchie e cavolo nero alla toscana", non "Zuppa")
-- ingredients: lista di oggetti [{"nome": "ingrediente", "quantità": "100g"}, ...]
-- instructions: lista di stringhe ["Passo 1...", "Passo 2...", ...]
-- calories: numero intero (calorie totali)
-- macros: {"proteine": X, "carboidrati": Y, "grassi": Z} in grammi (chiavi in italiano!)
-- prep_time: numero intero minuti preparazione
-- cooking_time: numero intero minuti cottura
-- seasonal_score: numero float 0.0-1.0 (quanto usa ingredienti stagionali)
-- notes: stringa con consigli per conservazione, varianti, meal prep
-
-LINEE GUIDA RICETTE AUTENTICHE:
-================================
-🇮🇹 **Ricette Italiane Tradizionali Rivisitate**
-- Rispetta le tecniche di cottura tradizionali italiane (soffritto, brasatura, etc)
-- Usa combinazioni di sapori classiche (pomodoro+basilico, rosmarino+aglio, salvia+burro)
-- Rivisita piatti classici in versione salutare (es: carbonara con yogurt greco)
-- Mantieni la struttura dei piatti regionali (zuppe toscane, risotti lombardi, paste siciliane)
-
-🌍 **Ricette Internazionali Autentiche**
-- Rispetta le combinazioni di spezie tipiche (curry indiano, ras el hanout marocchino)
-- Usa tecniche di cottura originali (stir-fry asiatico, slow cooking messicano)
-- Mantieni equilibri di sapori tradizionali (dolce-salato-acido asiatico)
-- Adatta ingredienti difficili con alternative locali stagionali
-
-📖 **Esperienza Culinaria e Coerenza**
-- Ogni ricetta deve avere una logica culinaria solida e testata
-- Tempi di cottura realistici basati su esperienza vera
-- Sequenza di preparazione logica: mise en place → cottura base → assemblaggio → finitura
-- Tecniche appropriate: soffritto per basi, rosolatura per proteine, mantecatura per cremosità
-- Bilanciamento sapori: salato, dolce, acido, amaro, umami
-- Temperature e modalità specifiche (fuoco medio, fiamma bassa, etc)
-
-🥘 **Praticità e Meal Prep**
-- Ricette batch-friendly: si possono preparare in quantità e conservare
-- Istruzioni chiare per conservazione (frigo 3-4 giorni, freezer 2-3 mesi)
-- Suggerimenti per riscaldamento ottimale senza perdere qualità
-- Varianti per diverse occasioni o ingredienti disponibili
-
-⚠️ **Errori da Evitare**
-- ❌ Combinazioni innaturali o fusion senza senso culinario
-- ❌ Tempi di cottura irrealistici (es: "cuocere legumi in 5 minuti")
-- ❌ Ingredienti incompatibili (yogurt in cottura lunga, limone con latte)
-- ❌ Procedure illogiche (spezie aggiunte a fine cottura quando vanno tostate all'inizio)
-- ❌ Quantità sproporzionate (troppo olio, troppe spezie, porzioni irreali)
-- ❌ Nomi generici: NO "Insalata", "Pasta", "Zuppa" → SÌ "Insalata di farro con ceci e rucola", "Penne integrali al pesto di cavolo nero"
-
-ESEMPIO RICETTA AUTENTICA:
-{
-  "recipe_name": "Zuppa di lenticchie e cavolo nero alla toscana",
-  "ingredients": [
-    {"nome": "lenticchie secche", "quantità": "200g"},
-    {"nome": "cavolo nero", "quantità": "150g"},
-    {"nome": "carote", "quantità": "100g"},
-    {"nome": "sedano", "quantità": "50g"},
-    {"nome": "cipolla", "quantità": "80g"},
-    {"nome": "pomodori pelati", "quantità": "200g"},
-    {"nome": "olio extravergine oliva", "quantità": "2 cucchiai"},
-    {"nome": "aglio", "quantità": "2 spicchi"},
-    {"nome": "rosmarino fresco", "quantità": "1 rametto"},
-    {"nome": "brodo vegetale", "quantità": "1 litro"},
-    {"nome": "sale", "quantità": "q.b."},
-    {"nome": "pepe nero", "quantità": "q.b."}
-  ],
-  "instructions": [
-    "Sciacquare le lenticchie sotto acqua corrente. Se usi lenticchie secche normali, metterle in ammollo 2 ore (le lenticchie rosse non servono ammollo)",
-    "Preparare un soffritto classico: in una pentola capiente scaldare l'olio a fuoco medio, aggiungere cipolla tritata fine, carote e sedano a cubetti piccoli. Cuocere 5-7 minuti mescolando fino a doratura leggera",
-    "Aggiungere aglio tritato e rosmarino spezzettato, far rosolare 1-2 minuti fino a quando profuma (attenzione a non bruciare l'aglio)",
-    "Unire i pomodori pelati schiacciati con una forchetta e far insaporire 3-4 minuti a fuoco medio-alto, mescolando",
-    "Aggiungere le lenticchie scolate e il brodo vegetale caldo. Portare a ebollizione vivace",
-    "Abbassare il fuoco a medio-basso, coprire con coperchio e cuocere 25-30 minuti (20 min per lenticchie rosse)",
-    "A 10 minuti dalla fine cottura, aggiungere il cavolo nero lavato e tagliato a striscioline sottili, mescolare bene",
-    "Assaggiare e aggiustare di sale e pepe. Se troppo denso, aggiungere poco brodo caldo",
-    "Servire ben calda con un filo d'olio extravergine a crudo e, se gradito, crostini di pane integrale"
-  ],
-  "calories": 420,
-  "macros": {"proteine": 24, "carboidrati": 58, "grassi": 10},
-  "prep_time": 20,
-  "cooking_time": 35,
-  "seasonal_score": 0.95,
-  "notes": "Piatto della tradizione toscana povera, nutriente e completo. Si conserva perfettamente in frigo 4 giorni in contenitore ermetico. Ideale per meal prep: riscaldare a fuoco dolce aggiungendo 2-3 cucchiai di brodo per riportare cremosità. Il sapore migliora il giorno dopo quando i sapori si amalgamano. Variante ribollita: aggiungere 50g di pasta corta integrale (ditalini) negli ultimi 10 minuti. Per versione cremosa: frullare metà zuppa e rimescolare. Freezer: congela benissimo, scongelare in frigo la sera prima."
-}
-
-⭐ GENERA RICETTE VERE, TESTATE, AUTENTICHE. Come se fossi uno chef professionista con 20 anni di esperienza in cucina italiana e internazionale. Ogni ricetta deve essere replicabile con successo da chiunque seguendo le tue istruzioni.
-"""
+""")
 
-        # Richiedi esplicitamente il JSON in un blocco di codice per facilitare il parsing
-        prompt += "\nATTENZIONE: Quando rispondi, restituisci SOLO il JSON della ricetta racchiuso all'interno di un blocco di codice con linguaggio 'json', ad esempio:\n```json\n{ ... }\n```\nNon inviare testo aggiuntivo prima o dopo il blocco di codice."
+        # Regole, formato risposta e ricetta d'esempio: testo statico precalcolato
+        parts.append(_SYSTEM_PROMPT_TAIL)
 
-        return prompt
+        return "".join(parts)
     
-    def generate_daily_plan(self, date: Optional[str] = None, is_workout_day: bool = False) -> DailyPlan:
+    def generate_daily_plan(self, date: Optional[str] = None, is_workout_day: bool = False,
+                            on_progress: Optional[Callable[[str], None]] = None,
+                            use_cache: bool = True) -> DailyPlan:
         """
         Genera piano pasti per una giornata.
         
         Args:
             date: Data in formato YYYY-MM-DD (default: oggi)
             is_workout_day: True se è un giorno di allenamento
+            on_progress: Riceve il testo generato finora, mentre la risposta arriva in streaming
+            use_cache: False per rigenerare i pasti ignorando la cache (le nuove ricette la sovrascrivono)
             
         Returns:
             DailyPlan completo con tutti i pasti
         """
+        return _run_sync(self.client, self.generate_daily_plan_async(date, is_workout_day, on_progress, use_cache),
+                         "generate_daily_plan_async")
+    
+    async def generate_daily_plan_async(self, date: Optional[str] = None, is_workout_day: bool = False,
+                                        on_progress: Optional[Callable[[str], None]] = None,
+                                        use_cache: bool = True) -> DailyPlan:
+        """Versione async di generate_daily_plan: i pasti sono generati in parallelo"""
+        daily_plan = await self._plan_day_async(date, is_workout_day, on_progress, use_cache)
+        self._record_daily_plan(daily_plan)
+        return daily_plan
+    
+    async def _plan_day_async(self, date: Optional[str], is_workout_day: bool,
+                              on_progress: Optional[Callable[[str], None]] = None,
+                              use_cache: bool = True) -> DailyPlan:
+        """Genera i pasti di una giornata (senza salvare): cache, poi una richiesta per l'intera giornata"""
         if not date:
-            date = datetime.now().strftime("%Y-%m-%d")
+            date = datetime.now().date().isoformat()
         
-        # Determina pasti da generare
-        meal_types = [
-            MealType.COLAZIONE,
-            MealType.SPUNTINO_MATTINA,
-            MealType.PRANZO,
-            MealType.SPUNTINO_POMERIGGIO,
-            MealType.CENA
-        ]
+        meals = {
+            meal_type: self._get_cached_meal(date, meal_type, is_workout_day) if use_cache else None
+            for meal_type in self._meal_types_for(is_workout_day)
+        }
+        missing = [meal_type for meal_type, meal in meals.items() if meal is None]
         
-        if is_workout_day and self.profile.workout_time == "pomeriggio":
-            meal_types.append(MealType.POST_WORKOUT)
+        # Più pasti da generare: una sola richiesta LLM con tutti i pasti della giornata
+        if len(missing) > 1:
+            generated = await self._request_day_async(date, is_workout_day, on_progress)
+            for meal_type in missing:
+                meals[meal_type] = generated.get(meal_type)
+            missing = [meal_type for meal_type, meal in meals.items() if meal is None]
+        
+        # Pasti rimasti (risposta troncata o non valida): richieste singole in parallelo
+        for meal_type, meal in zip(missing, await asyncio.gather(
+            *(self._generate_meal_async(date, meal_type, is_workout_day, use_cache) for meal_type in missing)
+        ), strict=True):
+            meals[meal_type] = meal
+        return self._assemble_daily_plan(date, is_workout_day, list(meals.values()))
+    
+    async def _request_day_async(self, date: str, is_workout_day: bool,
+                                 on_progress: Optional[Callable[[str], None]] = None) -> Dict[MealType, MealPlan]:
+        """Richiesta unica per tutti i pasti di una giornata (pasti non validi esclusi dal risultato)"""
+        meal_types = self._meal_types_for(is_workout_day)
+        try:
+            response = await self._a_invoke(self._build_days_context([(date, is_workout_day)]),
+                                            max_tokens=2000 * len(meal_types), on_progress=on_progress)
+        except Exception as e:
+            print(f"❌ Errore generazione giornata {date}: {e}")
+            return {}
         
-        meals = []
+        day = next(_iter_json_objects(response.text or "", ("date", "meals")), None)
+        if day is None or not isinstance(day["meals"], dict):
+            return {}
+        
+        meals = {}
         for meal_type in meal_types:
-            meal = self._generate_meal(date, meal_type, is_workout_day)
-            meals.append(meal)
+            try:
+                meal = self._meal_from_dict(day["meals"][meal_type.value], date, meal_type)
+            except (KeyError, TypeError, ValueError, AttributeError):
+                continue
+            self._store_cached_meal(meal, is_workout_day)
+            meals[meal_type] = meal
+        return meals
+    
+    def _meal_types_for(self, is_workout_day: bool) -> List[MealType]:
+        """Pasti da generare per una giornata"""
+        if self.include_snacks:
+            meal_types = [
+                MealType.COLAZIONE,
+                MealType.SPUNTINO_MATTINA,
+                MealType.PRANZO,
+                MealType.SPUNTINO_POMERIGGIO,
+                MealType.CENA
+            ]
+        else:
+            meal_types = [MealType.COLAZIONE, MealType.PRANZO, MealType.CENA]
         
+        if is_workout_day and self.profile.workout_time == "pomeriggio":
+            meal_types.append(MealType.POST_WORKOUT)
+        return meal_types
+    
+    def _assemble_daily_plan(self, date: str, is_workout_day: bool, meals: List[MealPlan]) -> DailyPlan:
+        """Calcola totali e lista spesa dei pasti generati"""
         # Calcola totali
         total_calories = sum(m.calories for m in meals)
         total_macros = {
@@ -585,7 +1109,7 @@ ESEMPIO RICETTA AUTENTICA:
         # Genera lista della spesa
         shopping_list = self._generate_shopping_list(meals)
         
-        daily_plan = DailyPlan(
+        return DailyPlan(
             date=date,
             is_workout_day=is_workout_day,
             meals=meals,
@@ -594,148 +1118,200 @@ ESEMPIO RICETTA AUTENTICA:
             shopping_list=shopping_list,
             notes=f"Piano generato per {date} - {'Giorno allenamento' if is_workout_day else 'Giorno riposo'}"
         )
+    
+    def _record_daily_plan(self, daily_plan: DailyPlan):
+        """Aggiunge il piano allo storico e lo salva su disco"""
+        self._record_daily_plans([daily_plan])
+    
+    def _record_daily_plans(self, daily_plans: List[DailyPlan]):
+        """Aggiunge più piani allo storico con un solo append su disco"""
+        # Salva nello storico - dict JSON-safe costruiti direttamente (enum già convertiti)
+        plan_dicts = [daily_plan.to_dict() for daily_plan in daily_plans]
+        self._append_meal_history(plan_dicts)
         
-        # Salva nello storico - usa dict normale per evitare problemi con enum
-        # La conversione JSON-safe verrà fatta da _save_meal_history()
-        plan_dict = asdict(daily_plan)
-        self.meal_history.append(plan_dict)
-        self._save_meal_history()
-        
-        return daily_plan
+        # Storico non ancora caricato: i nuovi giorni verranno letti dal file al primo accesso
+        if self._totals is None:
+            return
+        self._recent.extend(plan_dicts)
+        rows = _history_totals(plan_dicts)
+        self._totals = {key: np.concatenate((column, rows[key])) for key, column in self._totals.items()}
     
     def _generate_meal(self, date: str, meal_type: MealType, is_workout_day: bool) -> MealPlan:
         """Genera un singolo pasto"""
+        cached = self._get_cached_meal(date, meal_type, is_workout_day)
+        if cached is not None:
+            return cached
         
-        # Context per AI
-        context = f"""Genera una ricetta per {meal_type.value} del {date}.
-
-Giorno di allenamento: {'Sì' if is_workout_day else 'No'}
-
-Requisiti specifici per {meal_type.value}:
-"""
+        # System prompt separato e identico per ogni pasto: prefisso riusabile dalla cache del provider
+        context = self._build_meal_context(date, meal_type, is_workout_day)
+        response = self.client.invoke(input=context, system_prompt=self.system_prompt, max_tokens=2000)
+        meal = self._parse_meal_response(response, date, meal_type)
+        self._store_cached_meal(meal, is_workout_day)
+        return meal
+    
+    async def _generate_meal_async(self, date: str, meal_type: MealType, is_workout_day: bool,
+                                   use_cache: bool = True) -> MealPlan:
+        """Genera un singolo pasto senza bloccare l'event loop (client.a_invoke)"""
+        if not (use_cache and self.use_meal_cache):
+            return await self._request_meal_async(date, meal_type, is_workout_day)
+        cached = self._get_cached_meal(date, meal_type, is_workout_day)
+        if cached is not None:
+            return cached
         
-        if meal_type == MealType.COLAZIONE:
-            context += (
-                "- Energetica ma leggera\n"
-                "- 300-500 calorie\n"
-                "- Proteine: 20-30g\n"
-                "- Stile italiano tendenzialmente dolce: yogurt greco, miele, tahina, avena/fiocchi d'avena, biscotti secchi, frutta secca (no frutta fresca)\n"
-                "- Evita uova/salato a colazione.\n"
-                "- Vietato usare quinoa a colazione.\n"
-            )
-        elif meal_type == MealType.PRANZO:
-            if is_workout_day:
-                context += (
-                    "- Bilanciata con focus su carboidrati complessi\n"
-                    "- 500-700 calorie\n"
-                    "- Proteine: 35-45g\n"
-                    "- Includi sempre una base tra: pane integrale, pasta integrale, riso integrale, cous cous integrale, farro, orzo, quinoa.\n"
-                    "- Varia le verdure; non usare cavolo nero tutti i giorni.\n"
-                    "- Per panini/sandwich non usare 'panino con farro': usa pane integrale.\n"
-                )
-            else:
-                context += (
-                    "- Bilanciata\n"
-                    "- 400-600 calorie\n"
-                    "- Proteine: 30-40g\n"
-                    "- Includi sempre una base tra: pane integrale, pasta integrale, riso integrale, cous cous integrale, farro, orzo, quinoa.\n"
-                    "- Varia le verdure; non usare cavolo nero tutti i giorni.\n"
-                    "- Per panini/sandwich non usare 'panino con farro': usa pane integrale.\n"
-                )
-        elif meal_type == MealType.CENA:
-            context += (
-                "- Leggera e digeribile\n"
-                "- 400-600 calorie\n"
-                "- Proteine: 30-40g\n"
-                "- Includi sempre una base tra: pane integrale, pasta integrale, riso integrale, cous cous integrale, farro, orzo, quinoa.\n"
-                "- Varia le verdure; non usare cavolo nero tutti i giorni.\n"
-                "- Per panini/sandwich non usare 'panino con farro': usa pane integrale.\n"
-            )
-        elif meal_type in [MealType.SPUNTINO_MATTINA, MealType.SPUNTINO_POMERIGGIO]:
-            context += "- Leggero e nutriente\n- 150-250 calorie\n- Proteine: 10-15g\n"
-        elif meal_type == MealType.POST_WORKOUT:
-            context += "- Recovery focused\n- Proteine + carboidrati\n- 300-400 calorie\n- Proteine: 25-35g\n"
+        # Stessa chiave già in generazione (stesso pasto e giorno richiesto due volte): una sola richiesta
+        key = self._meal_cache_key(date, meal_type, is_workout_day)
+        pending = self._pending_meals.get(key)
+        if pending is None:
+            pending = asyncio.ensure_future(self._request_meal_async(date, meal_type, is_workout_day))
+            self._pending_meals[key] = pending
+            pending.add_done_callback(lambda _: self._pending_meals.pop(key, None))
+        return await pending
+    
+    async def _request_meal_async(self, date: str, meal_type: MealType, is_workout_day: bool) -> MealPlan:
+        """Richiesta LLM per un pasto, con salvataggio in cache del risultato"""
+        context = self._build_meal_context(date, meal_type, is_workout_day)
+        response = await self._a_invoke(context, max_tokens=2000)
+        meal = self._parse_meal_response(response, date, meal_type)
+        self._store_cached_meal(meal, is_workout_day)
+        return meal
+    
+    async def _a_invoke(self, context: str, max_tokens: int, on_progress: Optional[Callable[[str], None]] = None):
+        """client.a_invoke con al massimo max_parallel_requests chiamate in volo (in streaming se on_progress)"""
+        # Le API async possono essere chiamate da loop diversi: il semaforo va ricreato per loop
+        loop = asyncio.get_running_loop()
+        if self._request_slots_loop is not loop:
+            self._request_slots = asyncio.Semaphore(self.max_parallel_requests)
+            self._request_slots_loop = loop
+        async with self._request_slots:
+            # Il system prompt viaggia come messaggio di sistema: stesso prefisso per ogni
+            # richiesta, così il prompt caching del provider (Gemini/OpenAI) evita il prefill
+            if on_progress is not None:
+                # Streaming: on_progress riceve il testo accumulato ad ogni nuovo frammento.
+                # Il testo si ricostruisce dai delta: Google/Mistral mandano chunk con content vuoto
+                response = None
+                streamed_text = ""
+                try:
+                    async for response in self.client.a_stream_invoke(
+                        input=context, system_prompt=self.system_prompt, max_tokens=max_tokens
+                    ):
+                        if response.delta:
+                            streamed_text += response.delta
+                            on_progress(streamed_text)
+                except NotImplementedError:
+                    response = None
+                if response is not None:
+                    if streamed_text and not response.text:
+                        # Ultimo chunk senza content (solo delta): risposta completa dal buffer
+                        response = ClientResponse(content=[TextBlock(content=streamed_text)],
+                                                  stop_reason=response.stop_reason)
+                    return response
+            return await self.client.a_invoke(input=context, system_prompt=self.system_prompt, max_tokens=max_tokens)
+    
+    @cached_property
+    def _profile_digest(self) -> str:
+        """Impronta stabile del profilo (hash() di Python cambia ad ogni processo)"""
+        payload = json.dumps(_to_json_safe(asdict(self.profile)), sort_keys=True, ensure_ascii=False)
+        return hashlib.blake2b(payload.encode('utf-8'), digest_size=16).hexdigest()
+    
+    def _meal_cache_key(self, date: str, meal_type: MealType, is_workout_day: bool) -> str:
+        """Chiave cache: stesso pasto, data, tipo di giornata e profilo -> stessa richiesta"""
+        # La data (non il mese corrente) tiene distinti i giorni della settimana e i cambi di mese
+        raw = f"{meal_type.value}|{date}|{bool(is_workout_day)}|{self._profile_digest}"
+        return hashlib.blake2b(raw.encode('utf-8'), digest_size=16).hexdigest()
+    
+    def _get_cached_meal(self, date: str, meal_type: MealType, is_workout_day: bool) -> Optional[MealPlan]:
+        """Ricetta già generata per questa chiave, se presente (memoria, poi disco)"""
+        if not self.use_meal_cache:
+            return None
         
-        context += "\nGenera SOLO il JSON della ricetta, senza commenti aggiuntivi."
+        key = self._meal_cache_key(date, meal_type, is_workout_day)
+        entry = self._meal_cache.get(key)
+        if entry is None:
+            cache_file = self._meal_cache_dir / f"{key}.json"
+            try:
+                # mtime = momento della generazione; file mancante -> OSError
+                stored_at = cache_file.stat().st_mtime
+                with open(cache_file, 'rb') as f:
+                    entry = (stored_at, _json_loads(f.read()))
+            except (OSError, ValueError):
+                return None
+            self._meal_cache[key] = entry
+        
+        stored_at, meal_data = entry
+        # Scaduta (TTL): la ricetta verrà rigenerata e sovrascritta
+        if time.time() - stored_at > self._meal_cache_ttl:
+            del self._meal_cache[key]
+            return None
         
-        # Genera con AI usando invoke()
-        prompt = f"{self._build_system_prompt()}\n\n{context}"
-        response = self.client.invoke(input=prompt, max_tokens=2000)
+        try:
+            return self._meal_from_dict(meal_data, date, meal_type)
+        except (KeyError, TypeError, ValueError):
+            return None
+    
+    def _store_cached_meal(self, meal: MealPlan, is_workout_day: bool):
+        """Salva in cache una ricetta generata (mai i pasti di fallback)"""
+        if not self.use_meal_cache or not meal.ingredients:
+            return
+        
+        key = self._meal_cache_key(meal.date, meal.meal_type, is_workout_day)
+        meal_data = meal.to_dict()
+        self._meal_cache[key] = (time.time(), meal_data)
+        self._meal_cache_dir.mkdir(parents=True, exist_ok=True)
+        with open(self._meal_cache_dir / f"{key}.json", 'wb') as f:
+            f.write(_history_line(meal_data))
+    
+    def _build_meal_context(self, date: str, meal_type: MealType, is_workout_day: bool) -> str:
+        """Costruisce la richiesta per un singolo pasto (il system prompt è inviato a parte)"""
+        
+        meal_name = meal_type.value
+        
+        # Context per AI: requisiti del pasto da tabella precalcolata
+        context = f"""Genera una ricetta per {meal_name} del {date}.
+
+Giorno di allenamento: {'Sì' if is_workout_day else 'No'}
+
+Requisiti specifici per {meal_name}:
+{_MEAL_REQUIREMENTS[(meal_type, bool(is_workout_day))]}
+Genera SOLO il JSON della ricetta, senza commenti aggiuntivi."""
         
+        return context
+    
+    def _parse_meal_response(self, response, date: str, meal_type: MealType) -> MealPlan:
+        """Estrae il MealPlan dalla risposta LLM (fallback se il JSON non è valido)"""
         # Parse risposta (più robusto e con logging raw on failure)
         try:
             text = response.text or ""
 
-            # Prefer code-fenced JSON blocks
-            candidate = None
-            if "```json" in text:
-                candidate = text.split("```json", 1)[1].split("```", 1)[0].strip()
-            elif "```" in text:
-                candidate = text.split("```", 1)[1].split("```", 1)[0].strip()
-            else:
-                candidate = text.strip()
-
-            meal_data = None
-            
-            def _pre_fix_values(s: str) -> str:
-                """Heuristic fixes for common LLM JSON issues on values.
-                - Quote unquoted quantity values like 100g, 1 cucchiaio, 50 g, q.b., etc.
-                - Keep numeric fields (calories, prep_time, cooking_time, macros) untouched.
-                """
-                import re
-                t = s
-                # Quote unquoted quantities for keys quantità/quantity
-                # pattern: "quantità" : 100g  -> "quantità": "100g"
-                t = re.sub(r'("quantità"|"quantity")\s*:\s*([0-9]+\s*[a-zA-Z\.]+)', r'\1: "\2"', t)
-                # Also handle cases like 1 cucchiaio, 2 cucchiai, 50 ml, 1/2 cucchiaino
-                t = re.sub(r'("quantità"|"quantity")\s*:\s*([0-9]+\s*/?[0-9]*\s*[a-zA-ZàèéìòùÀÈÉÌÒÙ\.]+)', r'\1: "\2"', t)
-                # Quote q.b. if unquoted
-                t = re.sub(r'("quantità"|"quantity")\s*:\s*(q\.b\.)', r'\1: "q.b."', t)
-                # For ingredient-level dicts missing quotes around units with decimals/commas (e.g., 0,5 cucchiaino)
-                t = re.sub(r'("quantità"|"quantity")\s*:\s*([0-9]+[,\.]?[0-9]*\s*[a-zA-ZàèéìòùÀÈÉÌÒÙ\.]+)', r'\1: "\2"', t)
-                return t
-
-            # First try direct load
-            try:
-                meal_data = json.loads(candidate)
-            except Exception:
+            # First try: JSON valido scansionato direttamente nella risposta
+            meal_data = _find_meal_json(text)
+            if meal_data is None:
+                # Prefer code-fenced JSON blocks
+                if "```json" in text:
+                    candidate = text.split("```json", 1)[1].split("```", 1)[0].strip()
+                elif "```" in text:
+                    candidate = text.split("```", 1)[1].split("```", 1)[0].strip()
+                else:
+                    candidate = text.strip()
+                
                 # Heuristic fixes
-                import re
-                fixed = candidate.replace("'", '"')
-                fixed = re.sub(r",\s*([}\]])", r"\1", fixed)
-                fixed = re.sub(r'([\{,\n\s])([A-Za-z0-9_]+)\s*:', lambda m: f'{m.group(1)}"{m.group(2)}":', fixed)
-                fixed = _pre_fix_values(fixed)
+                fixed = _repair_json(candidate)
                 try:
-                    meal_data = json.loads(fixed)
+                    meal_data = _json_loads(fixed)
                 except Exception:
                     # Try to find balanced JSON blocks in the whole response
-                    import re as _re
-                    # Find all candidate JSON-like blocks
-                    blocks = _re.findall(r"(\{(?:.|\n)*?\})|(\[(?:.|\n)*?\])", text)
                     best_candidate = None
-                    for b in blocks:
-                        blk = b[0] or b[1]
-                        if not blk:
+                    for blk in _iter_json_blocks(text):
+                        # Scarta subito i blocchi che non possono contenere una ricetta
+                        # (chiavi senza virgolette: verranno sistemate da _repair_json)
+                        if "recipe_name" not in blk or "ingredients" not in blk:
                             continue
                         # Try parse with fixes
-                        cand = blk.replace("'", '"')
-                        cand = _re.sub(r",\s*([}\]])", r"\1", cand)
-                        cand = _re.sub(r'([\{,\n\s])([A-Za-z0-9_]+)\s*:', lambda m: f'{m.group(1)}"{m.group(2)}":', cand)
-                        cand = _pre_fix_values(cand)
+                        cand = _repair_json(blk)
                         try:
-                            obj = json.loads(cand)
+                            obj = _json_loads(cand)
                         except Exception:
                             continue
-                        # If it's a list, search for a dict with required keys
-                        def pick_valid(o):
-                            if isinstance(o, dict) and all(k in o for k in ("recipe_name", "ingredients")):
-                                return o
-                            if isinstance(o, list):
-                                for it in o:
-                                    if isinstance(it, dict) and all(k in it for k in ("recipe_name", "ingredients")):
-                                        return it
-                            return None
-                        chosen = pick_valid(obj)
+                        chosen = _pick_meal(obj)
                         if chosen is not None:
                             best_candidate = chosen
                             break
@@ -753,29 +1329,7 @@ Requisiti specifici per {meal_type.value}:
                     pass
                 raise ValueError("No valid JSON found in LLM response")
 
-            # Normalizza i macros (gestisci chiavi inglesi/italiane)
-            macros = meal_data.get("macros", {})
-            normalized_macros = {
-                "proteine": float(macros.get("proteine") or macros.get("protein") or macros.get("proteins") or 0),
-                "carboidrati": float(macros.get("carboidrati") or macros.get("carbs") or macros.get("carbohydrates") or 0),
-                "grassi": float(macros.get("grassi") or macros.get("fats") or macros.get("fat") or 0)
-            }
-            
-            meal_plan = MealPlan(
-                date=date,
-                meal_type=meal_type,
-                recipe_name=meal_data["recipe_name"],
-                ingredients=meal_data["ingredients"],
-                instructions=meal_data["instructions"],
-                calories=int(meal_data["calories"]),
-                macros=normalized_macros,
-                prep_time=int(meal_data.get("prep_time", 0)),
-                cooking_time=int(meal_data.get("cooking_time", 0)),
-                notes=meal_data.get("notes", ""),
-                seasonal_score=meal_data.get("seasonal_score", 0.8)
-            )
-            
-            return meal_plan
+            return self._meal_from_dict(meal_data, date, meal_type)
             
         except Exception as e:
             print(f"❌ Errore parsing risposta AI: {e}")
@@ -783,6 +1337,30 @@ Requisiti specifici per {meal_type.value}:
             # Fallback
             return self._generate_fallback_meal(date, meal_type)
     
+    def _meal_from_dict(self, meal_data: Dict, date: str, meal_type: MealType) -> MealPlan:
+        """Costruisce un MealPlan dal JSON di una ricetta"""
+        # Normalizza i macros (gestisci chiavi inglesi/italiane)
+        macros = meal_data.get("macros", {})
+        normalized_macros = {
+            "proteine": float(macros.get("proteine") or macros.get("protein") or macros.get("proteins") or 0),
+            "carboidrati": float(macros.get("carboidrati") or macros.get("carbs") or macros.get("carbohydrates") or 0),
+            "grassi": float(macros.get("grassi") or macros.get("fats") or macros.get("fat") or 0)
+        }
+        
+        return MealPlan(
+            date=date,
+            meal_type=meal_type,
+            recipe_name=meal_data["recipe_name"],
+            ingredients=meal_data["ingredients"],
+            instructions=meal_data["instructions"],
+            calories=int(meal_data["calories"]),
+            macros=normalized_macros,
+            prep_time=int(meal_data.get("prep_time", 0)),
+            cooking_time=int(meal_data.get("cooking_time", 0)),
+            notes=meal_data.get("notes", ""),
+            seasonal_score=meal_data.get("seasonal_score", 0.8)
+        )
+    
     def _generate_fallback_meal(self, date: str, meal_type: MealType) -> MealPlan:
         """Genera un pasto fallback se AI fallisce"""
         return MealPlan(
@@ -800,29 +1378,15 @@ Requisiti specifici per {meal_type.value}:
     
     def _generate_shopping_list(self, meals: List[MealPlan]) -> List[str]:
         """Genera lista della spesa consolidata"""
-        ingredients_dict = {}
+        ingredients_dict = defaultdict(list)
         
         for meal in meals:
             for ingredient in meal.ingredients:
                 # Gestisci diverse strutture JSON
                 if isinstance(ingredient, dict):
-                    # Prova diverse chiavi possibili per il nome
-                    name = (
-                        ingredient.get("nome") or 
-                        ingredient.get("name") or 
-                        ingredient.get("ingrediente") or 
-                        ingredient.get("ingredient") or
-                        str(ingredient.get("item", "ingrediente sconosciuto"))
-                    ).lower()
-                    
-                    # Prova diverse chiavi possibili per la quantità
-                    qty = (
-                        ingredient.get("quantità") or 
-                        ingredient.get("quantity") or 
-                        ingredient.get("qty") or 
-                        ingredient.get("amount") or
-                        "q.b."
-                    )
+                    # Prova diverse chiavi possibili per nome e quantità
+                    name = str(ingredient_name(ingredient, "ingrediente sconosciuto")).lower()
+                    qty = ingredient_qty(ingredient)
                 elif isinstance(ingredient, str):
                     # Se è una stringa, usala direttamente
                     name = ingredient.lower()
@@ -832,24 +1396,26 @@ Requisiti specifici per {meal_type.value}:
                     name = str(ingredient).lower()
                     qty = "q.b."
                 
-                if name in ingredients_dict:
-                    ingredients_dict[name] += f", {qty}"
-                else:
-                    ingredients_dict[name] = qty
+                ingredients_dict[name].append(str(qty))
         
-        shopping_list = [f"{name}: {qty}" for name, qty in ingredients_dict.items()]
-        return sorted(shopping_list)
+        return [f"{name}: {_merge_quantities(qtys)}" for name, qtys in sorted(ingredients_dict.items())]
     
-    def generate_weekly_plan(self, start_date: Optional[str] = None) -> List[DailyPlan]:
+    def generate_weekly_plan(self, start_date: Optional[str] = None,
+                             on_day: Optional[Callable[[DailyPlan], None]] = None) -> List[DailyPlan]:
         """
         Genera piano settimanale completo.
         
         Args:
             start_date: Data inizio (default: lunedì prossimo)
+            on_day: Chiamata con ogni DailyPlan appena è pronto (ordine di completamento)
             
         Returns:
             Lista di 7 DailyPlan
         """
+        return _run_sync(self.client, self.generate_weekly_plan_async(start_date, on_day), "generate_weekly_plan_async")
+    
+    def _week_days(self, start_date: Optional[str]) -> List[tuple]:
+        """Date (YYYY-MM-DD) e tipo di giornata dei 7 giorni a partire da start_date"""
         if not start_date:
             # Prossimo lunedì
             today = datetime.now()
@@ -857,26 +1423,120 @@ Requisiti specifici per {meal_type.value}:
             if days_ahead <= 0:
                 days_ahead += 7
             start = today + timedelta(days=days_ahead)
-            start_date = start.strftime("%Y-%m-%d")
+            start_date = start.date().isoformat()
         
-        weekly_plans = []
-        start = datetime.strptime(start_date, "%Y-%m-%d")
+        start = datetime.fromisoformat(start_date)
+        dates = [start + timedelta(days=i) for i in range(7)]
         
-        weekday_map = ["lunedì", "martedì", "mercoledì", "giovedì", "venerdì", "sabato", "domenica"]
-        
-        for i in range(7):
-            current_date = start + timedelta(days=i)
-            date_str = current_date.strftime("%Y-%m-%d")
-            weekday = weekday_map[current_date.weekday()]
-            
-            is_workout = weekday in (self.profile.workout_days or [])
+        days = []
+        for current_date in dates:
+            date_str = current_date.date().isoformat()
+            weekday = WEEKDAYS_IT[current_date.weekday()]
+            is_workout = weekday in self._workout_days
             
             print(f"📅 Generando piano per {weekday} {date_str} {'💪' if is_workout else '🏠'}")
-            daily_plan = self.generate_daily_plan(date_str, is_workout)
-            weekly_plans.append(daily_plan)
+            days.append((date_str, is_workout))
+        return days
+    
+    async def generate_weekly_plan_async(self, start_date: Optional[str] = None,
+                                         on_day: Optional[Callable[[DailyPlan], None]] = None) -> List[DailyPlan]:
+        """Versione async di generate_weekly_plan (per chi ha già un event loop attivo)"""
+        return await self._generate_weekly_plan_async(self._week_days(start_date), on_day)
+    
+    async def _generate_weekly_plan_async(self, days: List[tuple],
+                                          on_day: Optional[Callable[[DailyPlan], None]] = None) -> List[DailyPlan]:
+        """Genera la settimana con una sola richiesta LLM e la salva in ordine cronologico"""
+        plans = {}
+        
+        def add_days(text: str) -> bool:
+            new_days = {date_str: plan for date_str, plan in self._parse_days(text, days).items() if date_str not in plans}
+            plans.update(new_days)
+            if on_day is not None:
+                for daily_plan in new_days.values():
+                    on_day(daily_plan)
+            return bool(new_days)
+        
+        on_progress = None
+        if on_day is not None:
+            # In streaming: ogni giorno è notificato appena la sua riga JSON è completa
+            parsed_upto = 0
+            
+            def on_progress(text: str) -> None:
+                nonlocal parsed_upto
+                line_end = text.rfind("\n") + 1
+                if line_end > parsed_upto and add_days(text[parsed_upto:line_end]):
+                    parsed_upto = line_end
+        
+        try:
+            response = await self._a_invoke(self._build_days_context(days), max_tokens=20000, on_progress=on_progress)
+            add_days(response.text or "")
+        except Exception as e:
+            print(f"❌ Errore generazione settimanale: {e}")
         
+        # Giorni mancanti (risposta troncata o non valida): una richiesta per giorno, in parallelo
+        missing = [(date_str, is_workout) for date_str, is_workout in days if date_str not in plans]
+        if missing:
+            print(f"⚠️ {len(missing)} giorni non presenti nella risposta settimanale, genero giorno per giorno")
+            for next_plan in asyncio.as_completed(
+                [self._plan_day_async(date_str, is_workout) for date_str, is_workout in missing]
+            ):
+                daily_plan = await next_plan
+                plans[daily_plan.date] = daily_plan
+                if on_day is not None:
+                    on_day(daily_plan)
+        
+        weekly_plans = [plans[date_str] for date_str, _ in days]
+        self._record_daily_plans(weekly_plans)
         return weekly_plans
     
+    def _build_days_context(self, days: List[tuple]) -> str:
+        """Richiesta unica per più giorni: un oggetto JSON per giorno, uno per riga"""
+        schedule = ""
+        requirements = {}
+        for date_str, is_workout in days:
+            meal_types = self._meal_types_for(is_workout)
+            schedule += f"- {date_str} ({'allenamento' if is_workout else 'riposo'}): {', '.join(m.value for m in meal_types)}\n"
+            for meal_type in meal_types:
+                requirements.setdefault((meal_type, is_workout), _MEAL_REQUIREMENTS[(meal_type, is_workout)])
+        
+        rules = "\n".join(
+            f"{meal_type.value} (giorno di {'allenamento' if is_workout else 'riposo'}):\n{text}"
+            for (meal_type, is_workout), text in requirements.items()
+        )
+        
+        period = "1 giorno" if len(days) == 1 else f"{len(days)} giorni"
+        context = f"""Genera le ricette per {period}, un pasto per ciascuna voce:
+
+{schedule}
+Requisiti specifici per pasto:
+
+{rules}
+Varia le ricette tra i giorni: nessuna ricetta ripetuta nel periodo.
+
+FORMATO RISPOSTA (sostituisce le istruzioni precedenti sul formato): un oggetto JSON per giorno, uno per riga, senza testo aggiuntivo:
+{{"date": "YYYY-MM-DD", "meals": {{"<tipo pasto>": {{<ricetta nel formato dell'esempio>}}, ...}}}}"""
+        
+        return context
+    
+    def _parse_days(self, text: str, days: List[tuple]) -> Dict[str, DailyPlan]:
+        """Estrae i giorni completi dal testo multi-giorno (quelli troncati sono ignorati)"""
+        workout_by_date = dict(days)
+        plans = {}
+        for day in _iter_json_objects(text, ("date", "meals")):
+            date_str = day["date"]
+            if date_str not in workout_by_date or date_str in plans or not isinstance(day["meals"], dict):
+                continue
+            is_workout = workout_by_date[date_str]
+            try:
+                meals = [
+                    self._meal_from_dict(day["meals"][meal_type.value], date_str, meal_type)
+                    for meal_type in self._meal_types_for(is_workout)
+                ]
+            except (KeyError, TypeError, ValueError, AttributeError):
+                continue
+            plans[date_str] = self._assemble_daily_plan(date_str, is_workout, meals)
+        return plans
+    
     def get_meal_suggestions(self, meal_type: MealType, preferences: Dict | None = None) -> List[str]:
         """
         Ottieni suggerimenti veloci per un tipo di pasto.
@@ -888,38 +1548,59 @@ Requisiti specifici per {meal_type.value}:
         Returns:
             Lista di nomi ricette suggerite
         """
-        context = f"""Suggerisci 5 ricette diverse per {meal_type.value}.
+        context = self._build_suggestions_context(meal_type, preferences)
+        
+        # Usa invoke() invece di generate_content()
+        response = self.client.invoke(input=context, system_prompt=self.system_prompt, max_tokens=500)
+        return self._parse_suggestions(response)
+    
+    def get_all_meal_suggestions(self, preferences: Dict | None = None) -> Dict[MealType, List[str]]:
+        """Suggerimenti per ogni tipo di pasto, con le richieste LLM in parallelo"""
+        return _run_sync(self.client, self.get_all_meal_suggestions_async(preferences), "get_all_meal_suggestions_async")
+    
+    async def get_meal_suggestions_async(self, meal_type: MealType, preferences: Dict | None = None) -> List[str]:
+        """Versione async di get_meal_suggestions (rispetta max_parallel_requests)"""
+        response = await self._a_invoke(self._build_suggestions_context(meal_type, preferences), max_tokens=500)
+        return self._parse_suggestions(response)
+    
+    async def get_all_meal_suggestions_async(self, preferences: Dict | None = None) -> Dict[MealType, List[str]]:
+        """Versione async di get_all_meal_suggestions"""
+        meal_types = list(MealType)
+        suggestions = await asyncio.gather(
+            *(self.get_meal_suggestions_async(meal_type, preferences) for meal_type in meal_types)
+        )
+        return dict(zip(meal_types, suggestions, strict=True))
+    
+    def _build_suggestions_context(self, meal_type: MealType, preferences: Dict | None) -> str:
+        """Richiesta di 5 nomi di ricette per un tipo di pasto"""
+        return f"""Suggerisci 5 ricette diverse per {meal_type.value}.
 
 Preferenze extra: {preferences or 'nessuna'}
 
 Risposta in formato: lista semplice di nomi ricette, uno per riga."""
-
-        # Usa invoke() invece di generate_content()
-        prompt = f"{self._build_system_prompt()}\n\n{context}"
-        response = self.client.invoke(input=prompt, max_tokens=500)
-        
+    
+    def _parse_suggestions(self, response) -> List[str]:
+        """Primi 5 nomi di ricette dalla risposta (una per riga)"""
         suggestions = [line.strip("- ").strip() for line in response.text.split("\n") if line.strip()]
         return suggestions[:5]
     
     def analyze_nutrition_goals(self) -> str:
         """Analizza progressi verso obiettivi nutrizionali"""
         
-        # Ultimi 7 giorni
-        recent_history = self.meal_history[-7:] if len(self.meal_history) >= 7 else self.meal_history
+        # Ultimi 7 giorni (slice contigue delle colonne SoA)
+        self._ensure_meal_history()
+        recent = {key: column[-7:] for key, column in self._totals.items()}
+        n_days = recent["calories"].size
         
-        if not recent_history:
+        if not n_days:
             return "📊 Nessuno storico disponibile. Inizia a generare piani pasti!"
         
-        avg_calories = sum(day["total_calories"] for day in recent_history) / len(recent_history)
-        avg_protein = sum(day["total_macros"]["proteine"] for day in recent_history) / len(recent_history)
-        
-        seasonal_scores = []
-        for day in recent_history:
-            for meal in day["meals"]:
-                seasonal_scores.append(meal.get("seasonal_score", 0))
-        avg_seasonal = sum(seasonal_scores) / len(seasonal_scores) if seasonal_scores else 0
+        avg_calories = recent["calories"].mean()
+        avg_protein = recent["protein"].mean()
+        n_meals = recent["meals"].sum()
+        avg_seasonal = recent["seasonal_score"].sum() / n_meals if n_meals else 0
         
-        report = f"""📊 ANALISI NUTRIZIONALE - Ultimi {len(recent_history)} giorni
+        report = f"""📊 ANALISI NUTRIZIONALE - Ultimi {n_days} giorni
 
 Calorie medie: {avg_calories:.0f} kcal/giorno
 Proteine medie: {avg_protein:.1f}g/giorno
@@ -41,30 +41,38 @@ from datetime import datetime, timedelta
 import json
 import os
 import pickle
+import hashlib
+import platform
+import subprocess
+import time
+import traceback
 from typing import Optional
 from dotenv import load_dotenv
 
-# Load env
-# 1) carica .env dalla root del progetto (cwd)
-load_dotenv()
-# 2) sovrascrivi con eventuale .env locale della cartella nutrition-agent
-try:
-    load_dotenv(dotenv_path=str(Path(__file__).parent / ".env"), override=True)
-except Exception:
-    pass
+# Load env: una volta per processo, non ad ogni rerun
+# (il salvataggio della API key dalla sidebar aggiorna anche os.environ)
+@st.cache_resource(show_spinner=False)
+def _load_env() -> None:
+    # 1) carica .env dalla root del progetto (cwd)
+    load_dotenv()
+    # 2) sovrascrivi con eventuale .env locale della cartella nutrition-agent
+    try:
+        load_dotenv(dotenv_path=str(Path(__file__).parent / ".env"), override=True)
+    except Exception:
+        pass
+
+_load_env()
 
-# Import nutrition agent
-sys.path.insert(0, str(Path(__file__).parent))
+# Import nutrition agent (cartella aggiunta a sys.path una volta sola: lo script è rieseguito ad ogni rerun)
+if str(Path(__file__).parent) not in sys.path:
+    sys.path.insert(0, str(Path(__file__).parent))
 from nutrition_agent import (
     NutritionAgent, UserProfile, MealType, ActivityLevel, 
-    DietaryGoal, create_sample_profile
+    DietaryGoal, create_sample_profile, MONTHS_IT, WEEKDAYS_IT,
+    ingredient_name, ingredient_qty, profile_to_json_bytes
 )
 from rag.index import RecipeIndexer, RAGConfig
 
-# Import clients (installed in editable mode)
-from datapizza.clients.google import GoogleClient  # type: ignore
-from datapizza.clients.openai_like import OpenAILikeClient  # type: ignore
-
 # Page config
 st.set_page_config(
     page_title="🥗 Nutrition Agent - Verdure & Benessere",
@@ -75,6 +83,9 @@ st.set_page_config(
 
 # Small factory to build LLM client from settings
 def create_llm_client(provider: str, api_key: str | None, model: str, base_url: str | None):
+    # Import al primo utilizzo: l'SDK del client non pesa sul caricamento della pagina
+    from datapizza.clients.openai_like import OpenAILikeClient  # type: ignore
+
     provider = (provider or "groq").lower()
     
     # Priorità a Groq
@@ -92,6 +103,21 @@ def create_llm_client(provider: str, api_key: str | None, model: str, base_url:
         raise ValueError(f"Manca la API key per il provider {provider}. Inseriscila nella sidebar.")
     return OpenAILikeClient(api_key=api_key, model=model, base_url=base_url)
 
+@st.cache_resource(show_spinner=False)
+def _cached_llm_client(provider: str, model: str, base_url: str | None, api_key_digest: str, _api_key: str | None):
+    # _api_key è escluso dall'hash di Streamlit: la cache usa solo il digest della chiave
+    return create_llm_client(provider, _api_key, model, base_url)
+
+# Client LLM condiviso tra i rerun: stessa sessione HTTP finché provider/modello/chiave non cambiano
+def get_llm_client(provider: str, api_key: str | None, model: str, base_url: str | None):
+    api_key_digest = hashlib.sha256(api_key.encode()).hexdigest()[:16] if api_key else ""
+    return _cached_llm_client(provider, model, base_url, api_key_digest, api_key)
+
+# Lista spesa già serializzata: DailyPlan ha __slots__, quindi i byte si memorizzano per contenuto
+@st.cache_data(show_spinner=False, max_entries=8)
+def _shopping_bytes(items: tuple) -> bytes:
+    return "\n".join(f"☐ {item}" for item in items).encode("utf-8")
+
 # Custom CSS - Tema Verdure Stagionali Allegro
 st.markdown("""
 <style>
@@ -260,14 +286,7 @@ seasonal_emojis = {
     "novembre": "🍂 🎃 🥦 🥬 🍄",
     "dicembre": "❄️ 🥦 🥬 🫑 🎄"
 }
-current_month = datetime.now().strftime("%B").lower()
-month_map = {
-    "january": "gennaio", "february": "febbraio", "march": "marzo",
-    "april": "aprile", "may": "maggio", "june": "giugno",
-    "july": "luglio", "august": "agosto", "september": "settembre",
-    "october": "ottobre", "november": "novembre", "december": "dicembre"
-}
-current_month_it = month_map.get(current_month, "novembre")
+current_month_it = MONTHS_IT[datetime.now().month - 1]
 st.markdown(f'<p style="text-align: center; font-size: 1.5rem;">{seasonal_emojis.get(current_month_it, "🥬 🥦 🥕")}</p>', unsafe_allow_html=True)
 st.markdown(f'<p style="text-align: center; color: #666;">🍽️ Il tuo assistente AI per alimentazione sana e personalizzata - Stagione: {current_month_it.title()}</p>', unsafe_allow_html=True)
 
@@ -278,6 +297,8 @@ if 'agent' not in st.session_state:
     st.session_state.agent = None
 if 'current_plan' not in st.session_state:
     st.session_state.current_plan = None
+if 'regenerate_plan' not in st.session_state:
+    st.session_state.regenerate_plan = False
 if 'weekly_plan' not in st.session_state:
     st.session_state.weekly_plan = None
 if 'recipe_indexer' not in st.session_state:
@@ -348,17 +369,15 @@ def load_indexer_from_meta() -> Optional[RecipeIndexer]:
     return None
 
 # Try to load cached plan/index at startup
-cached_plan = load_plan_cache()
-if cached_plan is not None and st.session_state.current_plan is None:
-    st.session_state.current_plan = cached_plan
+# (solo se manca in sessione: ai rerun successivi nessuna lettura dal disco)
+if st.session_state.current_plan is None:
+    st.session_state.current_plan = load_plan_cache()
 
-cached_weekly = load_weekly_cache()
-if cached_weekly is not None and st.session_state.weekly_plan is None:
-    st.session_state.weekly_plan = cached_weekly
+if st.session_state.weekly_plan is None:
+    st.session_state.weekly_plan = load_weekly_cache()
 
-cached_indexer = load_indexer_from_meta()
-if cached_indexer is not None and st.session_state.recipe_indexer is None:
-    st.session_state.recipe_indexer = cached_indexer
+if st.session_state.recipe_indexer is None:
+    st.session_state.recipe_indexer = load_indexer_from_meta()
 
 # Auto-carica profilo Antonio se non c'è profilo
 if st.session_state.profile is None:
@@ -380,29 +399,123 @@ def _provider_env_var(provider: str) -> str | None:
     }
     return mapping.get((provider or "").lower(), "API_KEY")
 
-# Inizializza agent se manca ma c'è un profilo
-if st.session_state.agent is None and st.session_state.profile is not None:
-    # Default a Groq
-    provider = st.session_state.get("llm_provider", "groq")
-    
-    # Default modello/base_url in base al provider
-    if provider == "groq":
-        model = st.session_state.get("llm_model", "llama-3.1-8b-instant")
-        base_url = st.session_state.get("llm_base_url", "https://api.groq.com/openai/v1")
-    else: # Fallback per altri provider
-        model = st.session_state.get("llm_model", "openrouter/auto")
-        base_url = st.session_state.get("llm_base_url", "https://openrouter.ai/api/v1")
-        
+# Provider/modello/base_url/chiave dalla sessione, con la stessa risoluzione della chiave ovunque
+def _session_llm_config(default_provider: str, default_model: str, default_base_url: str | None):
+    provider = st.session_state.get("llm_provider", default_provider)
+    model = st.session_state.get("llm_model", default_model)
+    base_url = st.session_state.get("llm_base_url", default_base_url)
     env_var = _provider_env_var(provider)
     api_key = os.getenv(env_var) if env_var else None
+    return provider, model, base_url, api_key
+
+# Campo di testo "a, b, c" -> ["a", "b", "c"] (voci vuote scartate)
+def _parse_csv(text: str) -> list[str]:
+    return [item.strip() for item in text.split(",") if item.strip()]
+
+# Agent della sessione riusato finché il client (già in cache) non cambia: storico e cache pasti restano caricati
+def _session_agent(client, profile) -> NutritionAgent:
+    agent = st.session_state.get("agent")
+    if agent is None or agent.client is not client:
+        return NutritionAgent(client, profile)
+    if agent.profile != profile:
+        agent.profile = profile
+    return agent
+
+# Fragment (Streamlit >= 1.33): i widget del piano rieseguono solo questo blocco, non l'intera pagina
+_fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None) or (lambda func: func)
+
+@_fragment
+def render_daily_plan(plan):
+    weekday_it = WEEKDAYS_IT[datetime.fromisoformat(plan.date).weekday()]
+    
+    # Summary
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("📆 Data", weekday_it.title())
+    with col2:
+        st.metric("🔥 Calorie Tot", f"{plan.total_calories} kcal")
+    with col3:
+        st.metric("🥩 Proteine", f"{plan.total_macros['proteine']:.0f}g")
+    with col4:
+        st.metric("💪 Allenamento", "Sì" if plan.is_workout_day else "No")
+    
+    st.markdown("---")
+    
+    # Meals
+    for meal in plan.meals:
+        meal_card_class = "meal-card workout-day" if plan.is_workout_day else "meal-card"
+        
+        with st.expander(f"🍽️ **{meal.meal_type.value.upper()}** - {meal.recipe_name} ({meal.calories} kcal)", expanded=True):
+            col1, col2 = st.columns([2, 1])
+            
+            with col1:
+                st.markdown("**📝 Ingredienti:**")
+                ingredient_lines = []
+                for ing in meal.ingredients:
+                    try:
+                        if isinstance(ing, dict):
+                            name = ingredient_name(ing)
+                            qty = ingredient_qty(ing)
+                        elif isinstance(ing, str):
+                            name = ing
+                            qty = "q.b."
+                        else:
+                            name = str(ing)
+                            qty = "q.b."
+                        ingredient_lines.append(f"- {name}: **{qty}**")
+                    except Exception:
+                        # fallback robusto
+                        ingredient_lines.append(f"- {str(ing)}")
+                st.markdown("\n".join(ingredient_lines))
+                
+                st.markdown("**👨‍🍳 Preparazione:**")
+                st.markdown("\n".join(f"{i}. {step}" for i, step in enumerate(meal.instructions, 1)))
+            
+            with col2:
+                st.markdown("**📊 Info Nutrizionali:**")
+                st.metric("Calorie", f"{meal.calories} kcal")
+                st.metric("Proteine", f"{meal.macros['proteine']}g")
+                st.metric("Carboidrati", f"{meal.macros['carboidrati']}g")
+                st.metric("Grassi", f"{meal.macros['grassi']}g")
+                
+                st.markdown(f"⏱️ **Prep:** {meal.prep_time} min")
+                st.markdown(f"🔥 **Cottura:** {meal.cooking_time} min")
+                
+                if meal.seasonal_score > 0.7:
+                    st.success(f"🌱 Stagionale: {meal.seasonal_score:.0%}")
+                
+                if meal.notes:
+                    st.info(f"💡 {meal.notes}")
+    
+    st.markdown("---")
+    
+    # Shopping List
+    with st.expander("🛒 Lista della Spesa", expanded=False):
+        st.markdown("**Ingredienti necessari:**")
+        st.markdown("\n".join(f"- {item}" for item in plan.shopping_list))
+        
+        # Download
+        st.download_button(
+            "📥 Scarica Lista",
+            _shopping_bytes(tuple(plan.shopping_list)),
+            file_name=f"spesa_{plan.date}.txt",
+            mime="text/plain"
+        )
+
+# Inizializza agent se manca ma c'è un profilo
+if st.session_state.agent is None and st.session_state.profile is not None:
+    # Default a Groq; modello/base_url di fallback per gli altri provider
+    if st.session_state.get("llm_provider", "groq") == "groq":
+        provider, model, base_url, api_key = _session_llm_config("groq", "llama-3.1-8b-instant", "https://api.groq.com/openai/v1")
+    else:
+        provider, model, base_url, api_key = _session_llm_config("groq", "openrouter/auto", "https://openrouter.ai/api/v1")
     
     if api_key or provider == "ollama":
         try:
-            client = create_llm_client(provider, api_key, model or "", base_url)
+            client = get_llm_client(provider, api_key, model or "", base_url)
             st.session_state.agent = NutritionAgent(client, st.session_state.profile)
             st.success(f"✅ Agent inizializzato con provider: **{provider}** (model: {model})")
         except Exception as e:
-            import traceback
             error_details = traceback.format_exc()
             st.error(f"⚠️ Errore inizializzazione agent con provider '{provider}': {e}")
             with st.expander("🔍 Dettagli errore completo"):
@@ -474,9 +587,9 @@ with st.sidebar:
                 os.environ[label] = new_key
             # Reinizializza client
             try:
-                client = create_llm_client(provider, new_key, model, base_url)
+                client = get_llm_client(provider, new_key, model, base_url)
                 if st.session_state.profile:
-                    st.session_state.agent = NutritionAgent(client, st.session_state.profile)
+                    st.session_state.agent = _session_agent(client, st.session_state.profile)
                 st.success("✅ API Key aggiornata e client reinizializzato")
                 st.rerun()
             except Exception as e:
@@ -505,7 +618,6 @@ with st.sidebar:
         else:
             with st.spinner("🔬 Analisi e indicizzazione dei PDF in corso..."):
                 try:
-                    from rag.index import RAGConfig
                     config = RAGConfig(corpus_dir=ricette_path, index_dir=index_path)
                     indexer = RecipeIndexer(config=config)
                     indexer.ensure_index() # build or load
@@ -546,13 +658,15 @@ with st.sidebar:
     }
     pasti_choice = st.selectbox("Seleziona numero pasti", list(pasti_options.keys()), index=0)
     st.session_state.include_snacks = pasti_options[pasti_choice]
+    # La sidebar gira prima delle pagine: ogni generazione usa la scelta corrente
+    if st.session_state.agent:
+        st.session_state.agent.include_snacks = st.session_state.include_snacks
 
     # Quick stats
     if st.session_state.agent:
         st.subheader("📈 Stats Rapide")
-        history = st.session_state.agent.meal_history
-        st.metric("Piani generati", len(history))
-        st.metric("Ricette totali", sum(len(day.get("meals", [])) for day in history))
+        st.metric("Piani generati", st.session_state.agent.history_days)
+        st.metric("Ricette totali", st.session_state.agent.total_meals)
 
 # ============================================================================
 # HOME PAGE
@@ -605,50 +719,35 @@ if page == "🏠 Home":
                 if st.session_state.agent is None:
                     st.error("❌ Agent non inizializzato. Controlla la configurazione del provider e ricarica la pagina.")
                 else:
-                    # Crea placeholder per la barra di avanzamento
-                    progress_bar = st.progress(0)
+                    # Placeholder per stato, tempo e anteprima live della risposta in streaming
                     status_text = st.empty()
                     timer_text = st.empty()
-                    steps_text = st.empty()
+                    stream_box = st.empty()
                     
                     try:
-                        import time
                         start_time = time.time()
                         
-                        today = datetime.now().strftime("%Y-%m-%d")
-                        weekday_it = ["lunedì", "martedì", "mercoledì", "giovedì", "venerdì", "sabato", "domenica"][datetime.now().weekday()]
+                        today = datetime.now().date().isoformat()
+                        weekday_it = WEEKDAYS_IT[datetime.now().weekday()]
                         is_workout = weekday_it in (st.session_state.profile.workout_days or [])
-                        include_snacks = bool(st.session_state.get("include_snacks", False))
                         
-                        # Callback per aggiornare la barra di avanzamento
-                        def update_progress(current, total, meal_name):
-                            progress = current / total
-                            progress_bar.progress(progress)
-                            elapsed = int(time.time() - start_time)
-                            status_text.markdown(f"### Generando {meal_name}... ({current}/{total})")
-                            # Mostra breadcrumb semplice 1, 2, 3 e 'Fine' al termine
-                            done_steps = ", ".join(str(i) for i in range(1, current + 1))
-                            if current < total:
-                                steps_text.text(f"Passi: {done_steps}")
-                            else:
-                                steps_text.text(f"Passi: {done_steps}, Fine")
-                            # Stima tempo
-                            est = int(elapsed / current * total) if current > 0 else 0
-                            timer_text.text(f"Tempo trascorso: {elapsed}s | Stima totale: ~{est}s")
+                        # Callback di streaming: riceve il testo generato finora
+                        def update_progress(text):
+                            ready = text.count('"recipe_name"')
+                            status_text.markdown(f"### Generando il piano... ({ready} ricette ricevute)")
+                            timer_text.text(f"Tempo trascorso: {int(time.time() - start_time)}s")
+                            stream_box.code(text[-1500:], language="json")
                         
+                        status_text.markdown("### Generando il piano...")
                         plan = st.session_state.agent.generate_daily_plan(
                             date=today, 
                             is_workout_day=is_workout, 
-                            include_snacks=include_snacks,
-                            progress_callback=update_progress,
-                            rag_enabled=st.session_state.get('rag_enabled', False),
-                            recipe_indexer=st.session_state.get('recipe_indexer')
+                            on_progress=update_progress
                         )
                         
                         total_time = int(time.time() - start_time)
-                        progress_bar.progress(1.0)
-                        status_text.markdown(f"### ✅ Piano completato ({3 if not include_snacks else 5}/{3 if not include_snacks else 5}) — Fine")
-                        steps_text.text("Passi: 1, 2, 3, Fine" if not include_snacks else "Passi: 1, 2, 3, 4, 5, Fine")
+                        stream_box.empty()
+                        status_text.markdown(f"### ✅ Piano completato ({len(plan.meals)} pasti) — Fine")
                         timer_text.text(f"Tempo totale: {total_time}s")
                         st.session_state.current_plan = plan
                         try:
@@ -701,15 +800,13 @@ elif page == "👤 Profilo":
             col1, col2 = st.columns(2)
             with col1:
                 st.markdown("**🥗 Cibi Preferiti (Top 20)**")
-                for food in profile.preferred_foods[:20]:
-                    st.markdown(f"- {food}")
+                st.markdown("\n".join(f"- {food}" for food in profile.preferred_foods[:20]))
                 if len(profile.preferred_foods) > 20:
                     st.markdown(f"*...e altri {len(profile.preferred_foods)-20}*")
             
             with col2:
                 st.markdown("**🚫 Cibi da Evitare**")
-                for food in profile.disliked_foods:
-                    st.markdown(f"- ❌ {food}")
+                st.markdown("\n".join(f"- ❌ {food}" for food in profile.disliked_foods))
             
             st.markdown("---")
             st.markdown("**📅 Giorni Allenamento**")
@@ -755,12 +852,9 @@ elif page == "👤 Profilo":
                     from profile_antonio import create_antonio_profile
                     st.session_state.profile = create_antonio_profile()
                     
-                    provider = st.session_state.get("llm_provider", "google")
-                    model_name = st.session_state.get("llm_model", "gemini-2.0-flash-exp")
-                    base_url = st.session_state.get("llm_base_url", None)
-                    api_key = os.getenv("GOOGLE_API_KEY") if provider == "google" else os.getenv("API_KEY")
-                    client = create_llm_client(provider, api_key, model_name or "", base_url)
-                    st.session_state.agent = NutritionAgent(client, st.session_state.profile)
+                    provider, model_name, base_url, api_key = _session_llm_config("google", "gemini-2.0-flash-exp", None)
+                    client = get_llm_client(provider, api_key, model_name or "", base_url)
+                    st.session_state.agent = _session_agent(client, st.session_state.profile)
                     
                     st.success("✅ Profilo Antonio caricato con successo!")
                     st.balloons()
@@ -811,7 +905,7 @@ elif page == "👤 Profilo":
                 
                 workout_days = st.multiselect(
                     "Giorni di allenamento",
-                    options=["lunedì", "martedì", "mercoledì", "giovedì", "venerdì", "sabato", "domenica"],
+                    options=list(WEEKDAYS_IT),
                     default=["lunedì", "mercoledì", "venerdì"]
                 )
                 
@@ -830,10 +924,10 @@ elif page == "👤 Profilo":
                     height=height,
                     activity_level=ActivityLevel[activity.upper()],
                     dietary_goal=DietaryGoal[goal.upper()],
-                    preferred_foods=[f.strip() for f in preferred.split(",")],
-                    disliked_foods=[f.strip() for f in disliked.split(",")],
-                    allergies=[a.strip() for a in allergies.split(",") if a.strip()],
-                    intolerances=[i.strip() for i in intolerances.split(",") if i.strip()],
+                    preferred_foods=_parse_csv(preferred),
+                    disliked_foods=_parse_csv(disliked),
+                    allergies=_parse_csv(allergies),
+                    intolerances=_parse_csv(intolerances),
                     vegetarian=vegetarian,
                     vegan=vegan,
                     gluten_free=gluten_free,
@@ -846,12 +940,9 @@ elif page == "👤 Profilo":
                 )
                 
                 # Inizializza agent
-                provider = st.session_state.get("llm_provider", "google")
-                model_name = st.session_state.get("llm_model", "gemini-2.0-flash-exp")
-                base_url = st.session_state.get("llm_base_url", None)
-                api_key = os.getenv("GOOGLE_API_KEY") if provider == "google" else os.getenv("API_KEY")
-                client = create_llm_client(provider, api_key, model_name or "", base_url)
-                agent = NutritionAgent(client, profile)
+                provider, model_name, base_url, api_key = _session_llm_config("google", "gemini-2.0-flash-exp", None)
+                client = get_llm_client(provider, api_key, model_name or "", base_url)
+                agent = _session_agent(client, profile)
                 
                 st.session_state.profile = profile
                 st.session_state.agent = agent
@@ -873,7 +964,7 @@ elif page == "📅 Piano Giornaliero":
         with col1:
             selected_date = st.date_input("Seleziona data", value=datetime.now())
         with col2:
-            weekday_it = ["lunedì", "martedì", "mercoledì", "giovedì", "venerdì", "sabato", "domenica"][selected_date.weekday()]
+            weekday_it = WEEKDAYS_IT[selected_date.weekday()]
             default_days = []
             if st.session_state.profile and getattr(st.session_state.profile, 'workout_days', None):
                 default_days = st.session_state.profile.workout_days
@@ -884,19 +975,24 @@ elif page == "📅 Piano Giornaliero":
         with col3:
             if st.button("🔄 Rigenera Piano", type="primary"):
                 st.session_state.current_plan = None
+                # La prossima generazione ignora la cache dei pasti: ricette nuove
+                st.session_state.regenerate_plan = True
         
-        if not st.session_state.current_plan or st.session_state.current_plan.date != selected_date.strftime("%Y-%m-%d"):
+        if not st.session_state.current_plan or st.session_state.current_plan.date != selected_date.isoformat():
             if st.button("✨ Genera Piano", type="primary", use_container_width=True):
+                # Anteprima live della risposta in streaming (coda del testo generato finora)
+                stream_box = st.empty()
                 with st.spinner("🤖 AI sta preparando il tuo piano..."):
                     try:
                         plan = st.session_state.agent.generate_daily_plan(
-                            date=selected_date.strftime("%Y-%m-%d"), 
+                            date=selected_date.isoformat(), 
                             is_workout_day=is_workout,
-                            include_snacks=bool(st.session_state.get("include_snacks", False)),
-                            rag_enabled=st.session_state.get('rag_enabled', False),
-                            recipe_indexer=st.session_state.get('recipe_indexer')
+                            on_progress=lambda text: stream_box.code(text[-1500:], language="json"),
+                            use_cache=not st.session_state.regenerate_plan
                         )
+                        stream_box.empty()
                         st.session_state.current_plan = plan
+                        st.session_state.regenerate_plan = False
                         try:
                             save_plan_cache(plan)
                         except Exception:
@@ -911,95 +1007,7 @@ elif page == "📅 Piano Giornaliero":
                             st.error(f"Errore nella generazione del piano: {e}")
         
         if st.session_state.current_plan:
-            plan = st.session_state.current_plan
-            
-            # Summary
-            col1, col2, col3, col4 = st.columns(4)
-            with col1:
-                st.metric("📆 Data", weekday_it.title())
-            with col2:
-                st.metric("🔥 Calorie Tot", f"{plan.total_calories} kcal")
-            with col3:
-                st.metric("🥩 Proteine", f"{plan.total_macros['proteine']:.0f}g")
-            with col4:
-                st.metric("💪 Allenamento", "Sì" if plan.is_workout_day else "No")
-            
-            st.markdown("---")
-            
-            # Meals
-            for meal in plan.meals:
-                meal_card_class = "meal-card workout-day" if plan.is_workout_day else "meal-card"
-                
-                with st.expander(f"🍽️ **{meal.meal_type.value.upper()}** - {meal.recipe_name} ({meal.calories} kcal)", expanded=True):
-                    col1, col2 = st.columns([2, 1])
-                    
-                    with col1:
-                        st.markdown("**📝 Ingredienti:**")
-                        for ing in meal.ingredients:
-                            try:
-                                if isinstance(ing, dict):
-                                    name = (
-                                        ing.get("nome")
-                                        or ing.get("name")
-                                        or ing.get("ingrediente")
-                                        or ing.get("ingredient")
-                                        or ing.get("item")
-                                        or "ingrediente"
-                                    )
-                                    qty = (
-                                        ing.get("quantità")
-                                        or ing.get("quantity")
-                                        or ing.get("qty")
-                                        or ing.get("amount")
-                                        or "q.b."
-                                    )
-                                elif isinstance(ing, str):
-                                    name = ing
-                                    qty = "q.b."
-                                else:
-                                    name = str(ing)
-                                    qty = "q.b."
-                                st.markdown(f"- {name}: **{qty}**")
-                            except Exception:
-                                # fallback robusto
-                                st.markdown(f"- {str(ing)}")
-                        
-                        st.markdown("**👨‍🍳 Preparazione:**")
-                        for i, step in enumerate(meal.instructions, 1):
-                            st.markdown(f"{i}. {step}")
-                    
-                    with col2:
-                        st.markdown("**📊 Info Nutrizionali:**")
-                        st.metric("Calorie", f"{meal.calories} kcal")
-                        st.metric("Proteine", f"{meal.macros['proteine']}g")
-                        st.metric("Carboidrati", f"{meal.macros['carboidrati']}g")
-                        st.metric("Grassi", f"{meal.macros['grassi']}g")
-                        
-                        st.markdown(f"⏱️ **Prep:** {meal.prep_time} min")
-                        st.markdown(f"🔥 **Cottura:** {meal.cooking_time} min")
-                        
-                        if meal.seasonal_score > 0.7:
-                            st.success(f"🌱 Stagionale: {meal.seasonal_score:.0%}")
-                        
-                        if meal.notes:
-                            st.info(f"💡 {meal.notes}")
-            
-            st.markdown("---")
-            
-            # Shopping List
-            with st.expander("🛒 Lista della Spesa", expanded=False):
-                st.markdown("**Ingredienti necessari:**")
-                for item in plan.shopping_list:
-                    st.markdown(f"- {item}")
-                
-                # Download
-                shopping_text = "\n".join([f"☐ {item}" for item in plan.shopping_list])
-                st.download_button(
-                    "📥 Scarica Lista",
-                    shopping_text,
-                    file_name=f"spesa_{plan.date}.txt",
-                    mime="text/plain"
-                )
+            render_daily_plan(st.session_state.current_plan)
 
 # ============================================================================
 # PIANO SETTIMANALE
@@ -1014,8 +1022,17 @@ elif page == "📆 Piano Settimanale":
         
         if st.button("✨ Genera Piano Settimanale", type="primary", use_container_width=True):
             with st.spinner("🤖 Generazione in corso... (può richiedere 1-2 minuti)"):
+                progress = st.progress(0.0, text="Giorni pronti: 0/7")
+                ready_days = []
+                
+                # Avanzamento giorno per giorno, man mano che l'agent completa i piani
+                def show_ready_day(day):
+                    ready_days.append(WEEKDAYS_IT[datetime.fromisoformat(day.date).weekday()].title())
+                    progress.progress(len(ready_days) / 7, text=f"Giorni pronti: {len(ready_days)}/7 ({', '.join(ready_days)})")
+                
                 try:
-                    weekly = st.session_state.agent.generate_weekly_plan()
+                    weekly = st.session_state.agent.generate_weekly_plan(on_day=show_ready_day)
+                    progress.empty()
                     # Save to session
                     st.session_state.weekly_plan = weekly
                     try:
@@ -1033,24 +1050,26 @@ elif page == "📆 Piano Settimanale":
         if 'weekly_plan' in st.session_state and st.session_state.weekly_plan:
             weekly = st.session_state.weekly_plan
             
-            # Weekly summary
-            total_weekly_cal = sum(day.total_calories for day in weekly)
+            # Weekly summary (un solo passaggio sui giorni)
+            total_weekly_cal = workout_days_count = all_meals = 0
+            for day in weekly:
+                total_weekly_cal += day.total_calories
+                workout_days_count += day.is_workout_day
+                all_meals += len(day.meals)
             avg_daily_cal = total_weekly_cal / 7
             
             col1, col2, col3 = st.columns(3)
             with col1:
                 st.metric("🔥 Calorie medie/giorno", f"{avg_daily_cal:.0f} kcal")
             with col2:
-                workout_days_count = sum(1 for day in weekly if day.is_workout_day)
                 st.metric("💪 Giorni allenamento", workout_days_count)
             with col3:
-                all_meals = sum(len(day.meals) for day in weekly)
                 st.metric("🍽️ Pasti totali", all_meals)
             
             st.markdown("---")
             
             # Daily tabs
-            weekday_names = ["Lunedì", "Martedì", "Mercoledì", "Giovedì", "Venerdì", "Sabato", "Domenica"]
+            weekday_names = [WEEKDAYS_IT[datetime.fromisoformat(day.date).weekday()].title() for day in weekly]
             tabs = st.tabs(weekday_names)
             
             for i, (tab, day) in enumerate(zip(tabs, weekly)):
@@ -1060,10 +1079,16 @@ elif page == "📆 Piano Settimanale":
                     
                     st.metric("🔥 Calorie totali", f"{day.total_calories} kcal")
                     
+                    # Una tabella per giorno invece di un expander per pasto
+                    meals_table = {"Pasto": [], "Ricetta": [], "kcal": [], "P (g)": [], "C (g)": [], "F (g)": []}
                     for meal in day.meals:
-                        with st.expander(f"**{meal.meal_type.value}** - {meal.recipe_name}", expanded=False):
-                            st.markdown(f"**Calorie:** {meal.calories} kcal")
-                            st.markdown(f"**Macros:** P:{meal.macros['proteine']}g | C:{meal.macros['carboidrati']}g | F:{meal.macros['grassi']}g")
+                        meals_table["Pasto"].append(meal.meal_type.value)
+                        meals_table["Ricetta"].append(meal.recipe_name)
+                        meals_table["kcal"].append(meal.calories)
+                        meals_table["P (g)"].append(meal.macros['proteine'])
+                        meals_table["C (g)"].append(meal.macros['carboidrati'])
+                        meals_table["F (g)"].append(meal.macros['grassi'])
+                    st.dataframe(meals_table, hide_index=True, use_container_width=True)
 
 # ============================================================================
 # CERCA RICETTE
@@ -1081,7 +1106,7 @@ elif page == "🔍 Cerca Ricette":
         with col1:
             meal_type = st.selectbox(
                 "Tipo pasto",
-                [e.value for e in MealType]
+                ["tutti i pasti"] + [e.value for e in MealType]
             )
         
         with col2:
@@ -1097,11 +1122,17 @@ elif page == "🔍 Cerca Ricette":
             
             with st.spinner("🤖 Cercando ricette..."):
                 try:
-                    meal_enum = MealType(meal_type)
-                    suggestions = st.session_state.agent.get_meal_suggestions(meal_enum, preferences)
-                    st.success(f"✅ Trovate {len(suggestions)} ricette!")
-                    for i, recipe in enumerate(suggestions, 1):
-                        st.markdown(f"{i}. **{recipe}**")
+                    if meal_type == "tutti i pasti":
+                        # Una richiesta per tipo di pasto, tutte in parallelo
+                        all_suggestions = st.session_state.agent.get_all_meal_suggestions(preferences)
+                    else:
+                        meal_enum = MealType(meal_type)
+                        all_suggestions = {meal_enum: st.session_state.agent.get_meal_suggestions(meal_enum, preferences)}
+                    st.success(f"✅ Trovate {sum(len(s) for s in all_suggestions.values())} ricette!")
+                    for meal_enum, suggestions in all_suggestions.items():
+                        if len(all_suggestions) > 1:
+                            st.markdown(f"#### {meal_enum.value.replace('_', ' ').title()}")
+                        st.markdown("\n".join(f"{i}. **{recipe}**" for i, recipe in enumerate(suggestions, 1)))
                 except Exception as e:
                     msg = str(e)
                     if "API key expired" in msg or "API_KEY_INVALID" in msg:
@@ -1202,8 +1233,6 @@ python tabata_personalizzabile.py
         """, language="bash")
         
         if st.button("📂 Apri cartella Tabata Timer"):
-            import subprocess
-            import platform
             tabata_path = Path(__file__).parent / "tabata-timer-main"
             if platform.system() == "Darwin":  # macOS
                 subprocess.run(["open", str(tabata_path)])
@@ -1275,17 +1304,16 @@ elif page == "📊 Analisi":
         st.markdown(report)
         
         # History visualization
-        if st.session_state.agent.meal_history:
+        if st.session_state.agent.history_days:
             st.markdown("### 📈 Storico Piani")
             
-            history_data = []
-            for day in st.session_state.agent.meal_history[-14:]:
-                history_data.append({
-                    "Data": day["date"],
-                    "Calorie": day["total_calories"],
-                    "Proteine": day["total_macros"]["proteine"],
-                    "Allenamento": "💪" if day["is_workout_day"] else "🏠"
-                })
+            # Colonne già pronte (una lista per colonna): niente dict per riga da convertire
+            history_data = {"Data": [], "Calorie": [], "Proteine": [], "Allenamento": []}
+            for day in st.session_state.agent.recent_history(14):
+                history_data["Data"].append(day["date"])
+                history_data["Calorie"].append(day["total_calories"])
+                history_data["Proteine"].append(day["total_macros"]["proteine"])
+                history_data["Allenamento"].append("💪" if day["is_workout_day"] else "🏠")
             
             st.dataframe(history_data, use_container_width=True)
 
@@ -1308,14 +1336,11 @@ Data Directory: data/nutrition/
         if st.button("🗑️ Cancella Storico", type="secondary"):
             if st.checkbox("Conferma cancellazione"):
                 st.session_state.agent.meal_history = []
-                st.session_state.agent._save_meal_history()
                 st.success("✅ Storico cancellato")
         
         if st.button("📥 Esporta Profilo"):
-            import json
-            from dataclasses import asdict
             if st.session_state.profile:
-                profile_json = json.dumps(asdict(st.session_state.profile), indent=2, default=str)
+                profile_json = profile_to_json_bytes(st.session_state.profile)
                 st.download_button(
                     "💾 Scarica JSON",
                     profile_json,
@@ -0,0 +1,352 @@
+"""
+Test Nutrition Agent - parsing risposte LLM, cache pasti e lista spesa (client finti, nessuna rete)
+"""
+
+import asyncio
+import json
+import re
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from datapizza.core.clients import ClientResponse
+from datapizza.type import TextBlock
+
+import nutrition_agent
+from nutrition_agent import (
+    MealType, NutritionAgent, create_sample_profile, profile_to_json_bytes, _iter_json_objects, _merge_quantities
+)
+
+
+def _recipe(name: str) -> dict:
+    return {
+        "recipe_name": name,
+        "ingredients": [{"nome": "farro", "quantità": "50g"}],
+        "instructions": ["Cuocere il farro"],
+        "calories": 300,
+        "macros": {"proteine": 10, "carboidrati": 40, "grassi": 5},
+    }
+
+
+class FakeClient:
+    """Client finto: risponde con testi fissi e registra le richieste"""
+
+    def __init__(self, reply):
+        self.reply = reply  # funzione (input, max_tokens) -> testo
+        self.calls = 0
+
+    async def a_invoke(self, input, system_prompt=None, max_tokens=None):
+        self.calls += 1
+        return ClientResponse(content=[TextBlock(content=self.reply(input, max_tokens))])
+
+
+class DeltaStreamingClient(FakeClient):
+    """Streaming come GoogleClient/Mistral: chunk con solo delta e content vuoto"""
+
+    def __init__(self, reply, chunk_size=40):
+        super().__init__(reply)
+        self.chunk_size = chunk_size
+        self.chunks_sent = 0
+
+    async def a_stream_invoke(self, input, system_prompt=None, max_tokens=None):
+        self.calls += 1
+        text = self.reply(input, max_tokens)
+        for i in range(0, len(text), self.chunk_size):
+            self.chunks_sent += 1
+            yield ClientResponse(content=[], delta=text[i:i + self.chunk_size])
+            await asyncio.sleep(0)
+        yield ClientResponse(content=[], delta="", stop_reason="stop")
+
+
+WEEK = [f"2025-11-{day:02d}" for day in range(3, 10)]
+
+
+def _days_reply(dates, skip_meal=None):
+    """Un oggetto JSON per giorno e per riga (tutti i tipi di pasto, tranne skip_meal)"""
+    lines = [
+        json.dumps({
+            "date": date,
+            "meals": {m.value: _recipe(f"{m.value} {date}") for m in MealType if m is not skip_meal},
+        })
+        for date in dates
+    ]
+    return "```json\n" + "\n".join(lines) + "\n```"
+
+
+def _week_reply(input, max_tokens):
+    return _days_reply(WEEK)
+
+
+def _plan_reply(input, max_tokens, skip_meal=None):
+    """Risponde come l'LLM: ricetta singola o i giorni elencati nella richiesta"""
+    single = re.search(r"Genera una ricetta per (\w+) del", input)
+    if single:
+        return "```json\n" + json.dumps(_recipe(f"singolo {single.group(1)}")) + "\n```"
+    dates = re.findall(r"^- (\d{4}-\d{2}-\d{2})", input, re.MULTILINE)
+    return _days_reply(dates, skip_meal)
+
+
+@pytest.fixture
+def make_agent(tmp_path):
+    def factory(client, **kwargs):
+        return NutritionAgent(client, create_sample_profile(), data_dir=str(tmp_path), **kwargs)
+    return factory
+
+
+class TestMergeQuantities:
+    """Aggregazione quantità per la lista della spesa"""
+
+    def test_sums_numeric_quantities_per_unit(self):
+        assert _merge_quantities(["100g", "50g", "2 cucchiai", "1 cucchiai"]) == "150g, 3 cucchiai"
+
+    def test_single_quantity_is_returned_verbatim(self):
+        assert _merge_quantities(["2 spicchi grandi"]) == "2 spicchi grandi"
+
+    def test_repeated_unparsed_quantities_are_counted(self):
+        """Quantità non sommabili ripetute non devono collassare in una sola voce"""
+        assert _merge_quantities(["2 spicchi grandi"] * 6) == "2 spicchi grandi ×6"
+        assert _merge_quantities(["1/2 cucchiaino", "1/2 cucchiaino", "100g"]) == "100g, 1/2 cucchiaino ×2"
+
+    def test_quantities_without_numbers_are_listed_once(self):
+        assert _merge_quantities(["q.b.", "q.b.", "100g"]) == "100g, q.b."
+
+
+@pytest.fixture(params=["orjson", "json"])
+def json_backend(request, monkeypatch):
+    """Esegue il test con orjson e con il solo modulo json della libreria standard"""
+    if request.param == "orjson":
+        if nutrition_agent.orjson is None:
+            pytest.skip("orjson non installato")
+    else:
+        monkeypatch.setattr(nutrition_agent, "orjson", None)
+    return request.param
+
+
+class TestIterJsonObjects:
+    """Estrazione degli oggetti JSON dalle risposte LLM"""
+
+    def test_one_object_per_line(self, json_backend):
+        text = _days_reply(WEEK[:3])
+
+        days = list(_iter_json_objects(text, ("date", "meals")))
+
+        assert [day["date"] for day in days] == WEEK[:3]
+        assert days[0]["meals"]["colazione"]["recipe_name"] == f"colazione {WEEK[0]}"
+
+    def test_pretty_printed_object(self, json_backend):
+        text = "Ecco la ricetta:\n```json\n" + json.dumps(_recipe("Zuppa di farro"), indent=2) + "\n```"
+
+        assert [obj["recipe_name"] for obj in _iter_json_objects(text, ("recipe_name", "ingredients"))] == [
+            "Zuppa di farro"
+        ]
+
+    def test_trailing_prose_and_invalid_objects_are_skipped(self, json_backend):
+        day = json.dumps({"date": WEEK[0], "meals": {}})
+        text = "\n".join([
+            day + " <- primo giorno",
+            '{"date": "%s", "meals": {"calorie": NaN' % WEEK[1],
+            '{"nota": "senza giorno"}',
+            json.dumps({"date": WEEK[2], "meals": {}}),
+        ])
+
+        assert [obj["date"] for obj in _iter_json_objects(text, ("date", "meals"))] == [WEEK[0], WEEK[2]]
+
+
+def test_profile_export_is_indented_json(json_backend):
+    profile = create_sample_profile()
+
+    exported = profile_to_json_bytes(profile)
+
+    data = json.loads(exported)
+    assert data["name"] == profile.name
+    assert data["activity_level"] == profile.activity_level.value
+    assert exported.startswith(b'{\n  "')
+
+
+class TestStreaming:
+    """Streaming delle risposte verso on_progress"""
+
+    def test_delta_only_stream_is_accumulated(self, make_agent):
+        text = "```json\n" + json.dumps(_recipe("Zuppa di farro")) + "\n```"
+        client = DeltaStreamingClient(lambda input, max_tokens: text)
+        agent = make_agent(client)
+        seen = []
+
+        response = asyncio.run(agent._a_invoke("ctx", max_tokens=100, on_progress=seen.append))
+
+        assert seen and all(seen)
+        assert seen[-1] == text
+        assert all(text.startswith(chunk) for chunk in seen)
+        assert response.text == text
+
+
+class TestDailyPlan:
+    """Piano giornaliero: una richiesta per la giornata, fallback per pasto, cache"""
+
+    def test_day_is_generated_with_one_request(self, make_agent):
+        client = FakeClient(_plan_reply)
+        agent = make_agent(client)
+
+        plan = agent.generate_daily_plan(WEEK[0], False)
+
+        assert client.calls == 1
+        assert [meal.recipe_name for meal in plan.meals] == [
+            f"{meal.meal_type.value} {WEEK[0]}" for meal in plan.meals
+        ]
+        assert len(plan.meals) == 5
+        assert plan.total_calories == 5 * 300
+
+    def test_meal_missing_from_day_reply_is_requested_alone(self, make_agent):
+        client = FakeClient(lambda input, max_tokens: _plan_reply(input, max_tokens, skip_meal=MealType.CENA))
+        agent = make_agent(client)
+
+        plan = agent.generate_daily_plan(WEEK[0], False)
+
+        assert client.calls == 2
+        dinner = next(meal for meal in plan.meals if meal.meal_type is MealType.CENA)
+        assert dinner.recipe_name.startswith("singolo ")
+        assert dinner.ingredients
+
+    def test_day_without_snacks_has_three_meals(self, make_agent):
+        client = FakeClient(_plan_reply)
+        agent = make_agent(client, include_snacks=False)
+
+        plan = agent.generate_daily_plan(WEEK[0], False)
+
+        assert client.calls == 1
+        assert [meal.meal_type for meal in plan.meals] == [MealType.COLAZIONE, MealType.PRANZO, MealType.CENA]
+        assert plan.total_calories == 3 * 300
+
+    def test_cached_meals_are_reused_for_the_same_day_only(self, make_agent):
+        client = FakeClient(_plan_reply)
+        agent = make_agent(client)
+
+        first = agent.generate_daily_plan(WEEK[0], False)
+        again = agent.generate_daily_plan(WEEK[0], False)
+        assert client.calls == 1
+        assert [meal.recipe_name for meal in again.meals] == [meal.recipe_name for meal in first.meals]
+
+        # Altro giorno di riposo: ricette nuove, non quelle del giorno prima
+        other = agent.generate_daily_plan(WEEK[1], False)
+        assert client.calls == 2
+        assert all(meal.recipe_name.endswith(WEEK[1]) for meal in other.meals)
+
+    def test_use_cache_false_regenerates_the_day(self, make_agent):
+        client = FakeClient(_plan_reply)
+        agent = make_agent(client)
+
+        agent.generate_daily_plan(WEEK[0], False)
+        agent.generate_daily_plan(WEEK[0], False, use_cache=False)
+        assert client.calls == 2
+
+        # La rigenerazione aggiorna la cache: la richiesta successiva non chiama l'LLM
+        agent.generate_daily_plan(WEEK[0], False)
+        assert client.calls == 2
+
+    def test_cache_key_follows_the_plan_date(self, make_agent):
+        agent = make_agent(FakeClient(_plan_reply))
+
+        keys = {agent._meal_cache_key(date, MealType.PRANZO, False) for date in ("2025-10-31", "2025-11-01")}
+        assert len(keys) == 2
+
+
+class TestSyncApi:
+    """Wrapper sincroni: un event loop per client, errore chiaro dentro un loop attivo"""
+
+    def test_sync_calls_reuse_one_loop_per_client(self, make_agent):
+        loops = []
+
+        class LoopRecordingClient(FakeClient):
+            async def a_invoke(self, input, system_prompt=None, max_tokens=None):
+                loops.append(asyncio.get_running_loop())
+                return await super().a_invoke(input, system_prompt, max_tokens)
+
+        client = LoopRecordingClient(_plan_reply)
+        make_agent(client).generate_daily_plan(WEEK[0], False)
+        make_agent(client).generate_daily_plan(WEEK[1], False)
+        make_agent(client).get_all_meal_suggestions()
+
+        assert len(loops) == 2 + len(MealType)
+        assert len(set(map(id, loops))) == 1
+        assert not loops[0].is_closed()
+
+    def test_sync_call_inside_running_loop_fails_clearly(self, make_agent):
+        agent = make_agent(FakeClient(_plan_reply))
+
+        async def call_sync_api():
+            agent.generate_daily_plan(WEEK[0], False)
+
+        with pytest.raises(RuntimeError, match="generate_daily_plan_async"):
+            asyncio.run(call_sync_api())
+
+
+class TestWeeklyPlan:
+    """Piano settimanale in una sola richiesta"""
+
+    def test_week_is_generated_with_one_request(self, make_agent):
+        client = FakeClient(_plan_reply)
+        agent = make_agent(client)
+
+        weekly = agent.generate_weekly_plan(WEEK[0])
+
+        assert client.calls == 1
+        assert [day.date for day in weekly] == WEEK
+        assert all(meal.recipe_name.endswith(day.date) for day in weekly for meal in day.meals)
+        assert agent.history_days == 7
+
+    def test_truncated_week_regenerates_only_missing_days(self, make_agent):
+        def reply(input, max_tokens):
+            text = _plan_reply(input, max_tokens)
+            # Risposta settimanale troncata dopo i primi due giorni
+            return "\n".join(text.splitlines()[:3]) if len(re.findall(r"^- \d{4}-", input, re.MULTILINE)) == 7 else text
+
+        client = FakeClient(reply)
+        agent = make_agent(client, use_meal_cache=False)
+
+        weekly = agent.generate_weekly_plan(WEEK[0])
+
+        # 1 richiesta settimanale + 1 richiesta per ciascuno dei 5 giorni mancanti
+        assert client.calls == 6
+        assert [day.date for day in weekly] == WEEK
+        assert all(meal.ingredients for day in weekly for meal in day.meals)
+        assert agent.history_days == 7
+
+    def test_on_day_fires_while_delta_stream_is_running(self, make_agent):
+        client = DeltaStreamingClient(_week_reply)
+        agent = make_agent(client)
+        chunks_at_day = []
+
+        weekly = agent.generate_weekly_plan(WEEK[0], on_day=lambda day: chunks_at_day.append(client.chunks_sent))
+
+        assert client.calls == 1
+        assert [day.date for day in weekly] == WEEK
+        assert len(chunks_at_day) == 7
+        # Il primo giorno arriva ben prima della fine dello stream
+        assert chunks_at_day[0] < client.chunks_sent // 2
+
+
+class TestMealHistory:
+    """Storico pasti JSONL"""
+
+    def test_meal_history_is_parsed_once_and_kept_in_sync(self, make_agent, monkeypatch):
+        agent = make_agent(FakeClient(_plan_reply))
+        agent.generate_daily_plan(WEEK[0], False)
+        reads = []
+        iter_history = agent.iter_meal_history
+        monkeypatch.setattr(agent, "iter_meal_history", lambda: reads.append(1) or iter_history())
+
+        assert [day["date"] for day in agent.meal_history] == [WEEK[0]]
+        agent.generate_daily_plan(WEEK[1], False)
+        assert [day["date"] for day in agent.meal_history] == WEEK[:2]
+        assert agent.history_days == 2
+        assert reads == [1]
+
+        agent.meal_history = []
+        assert agent.meal_history == []
+        assert agent.history_days == 0
+        assert reads == [1]
+        # Il file riscritto coincide con la copia in memoria
+        assert list(iter_history()) == []
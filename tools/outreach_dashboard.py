@@ -95,8 +95,8 @@ st.markdown('<div class="main-header">🎨 MOOD Email Outreach System</div>', un
 # Initialize
 @st.cache_resource
 def get_database():
-    """Get thread-safe database connection"""
-    return ContactDatabase()
+    """Get thread-safe database connection (stats served from in-memory replica)"""
+    return ContactDatabase(read_replica_interval=30)
 
 @st.cache_resource
 def get_agent_memory():
@@ -743,7 +743,8 @@ if st.session_state.current_tab == "tab_dashboard":
         st.warning(f"⚠️ {len(followup_contacts)} contacts need follow-up!")
         
         for contact in followup_contacts[:10]:
-            st.markdown(f"📧 {contact['email']} - {contact['organization']} (sent {contact['sent_at']})")
+            sent_at = datetime.fromtimestamp(contact['sent_at']).strftime('%Y-%m-%d')
+            st.markdown(f"📧 {contact['email']} - {contact['organization']} (sent {sent_at})")
     else:
         st.success("✅ All contacts up to date!")
 